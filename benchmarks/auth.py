@@ -0,0 +1,188 @@
+"""Benchmarks of the core auth hot paths against a local stand-in token endpoint.
+
+Measures Authorization.__init__ time, KeyAuth.__init__ latency, KeyAuth.__call__
+throughput, refresh latency and the number of token endpoint requests per
+refresh cycle. Results are printed as JSON, so runs can be compared.
+
+Usage: python -m benchmarks.auth [--calls N] [--threads 1 8 64] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.common import (
+    FakeRequest,
+    create_service_account_key,
+    summarize,
+    time_calls,
+    write_key_files,
+)
+from benchmarks.token_endpoint import LocalTokenEndpoint
+from stackit.core.auth_methods import token_provider
+from stackit.core.auth_methods.key_auth import KeyAuth
+from stackit.core.auth_methods.token_provider import TokenRegistry
+from stackit.core.auth_methods.token_state import RefreshPolicy
+from stackit.core.authorization import Authorization
+from stackit.core.configuration import Configuration, EnvironmentVariables
+from stackit.core.file_cache import get_default_file_cache
+from stackit.core.http_session import create_session
+
+
+def bench_authorization_init(endpoint: LocalTokenEndpoint, key_files: Dict[str, str], iterations: int) -> Dict:
+    os.environ[EnvironmentVariables.TOKEN_BASEURL_ENV] = endpoint.url
+    default_registry = token_provider._default_registry
+    authorizations = []
+
+    def cold():
+        # Nothing read from disk and no token fetched yet
+        get_default_file_cache().clear()
+        token_provider._default_registry = TokenRegistry()
+        authorizations.append(Authorization(Configuration(**key_files)))
+
+    def warm():
+        authorizations.append(Authorization(Configuration(**key_files)))
+
+    def shared():
+        authorizations.append(Authorization.shared(Configuration(**key_files)))
+
+    try:
+        results = {"cold": summarize(time_calls(cold, iterations))}
+        token_provider._default_registry = TokenRegistry()
+        results["warm"] = summarize(time_calls(warm, iterations))
+        results["shared"] = summarize(time_calls(shared, iterations))
+    finally:
+        token_provider._default_registry = default_registry
+    return results
+
+
+def bench_key_auth_init(endpoint: LocalTokenEndpoint, iterations: int) -> Dict:
+    service_account_key = create_service_account_key()
+    shared_registry = TokenRegistry()
+    instances = []
+
+    def first(lazy: bool):
+        # A new registry each time, so every instance has to set up its own token provider
+        instances.append(KeyAuth(service_account_key, endpoint.url, token_registry=TokenRegistry(), lazy=lazy))
+
+    def shared():
+        instances.append(KeyAuth(service_account_key, endpoint.url, token_registry=shared_registry))
+
+    return {
+        "first": summarize(time_calls(lambda: first(lazy=False), iterations)),
+        "first_lazy": summarize(time_calls(lambda: first(lazy=True), iterations)),
+        "shared": summarize(time_calls(shared, iterations)),
+    }
+
+
+def call_repeatedly(auth: KeyAuth, barrier: threading.Barrier, calls: int) -> None:
+    request = FakeRequest()
+    barrier.wait()
+    for _ in range(calls):
+        auth(request)
+
+
+def bench_key_auth_call(endpoint: LocalTokenEndpoint, threads: List[int], calls: int) -> Dict:
+    auth = KeyAuth(create_service_account_key(), endpoint.url, token_registry=TokenRegistry())
+    results = {}
+    for thread_count in threads:
+        barrier = threading.Barrier(thread_count + 1)
+        workers = [threading.Thread(target=call_repeatedly, args=(auth, barrier, calls)) for _ in range(thread_count)]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        results[str(thread_count)] = {"calls": thread_count * calls, "calls_per_second": thread_count * calls / elapsed}
+    return results
+
+
+def bench_refresh_latency(endpoint: LocalTokenEndpoint, iterations: int) -> Dict:
+    registry = TokenRegistry()
+    provider = registry.acquire(create_service_account_key(), endpoint.url, create_session())
+    provider.start()
+    try:
+        return summarize(time_calls(lambda: provider.schedule_refresh(force=True).result(), iterations))
+    finally:
+        registry.release(provider)
+
+
+def bench_refresh_cycle(token_lifetime: float, cycles: int, instances: int, threads: int) -> Dict:
+    """Count token endpoint requests while many instances sharing a key keep sending requests."""
+    policy = RefreshPolicy(refresh_before=timedelta(seconds=token_lifetime / 2), jitter=timedelta(0))
+    with LocalTokenEndpoint(token_lifetime=token_lifetime) as endpoint:
+        registry = TokenRegistry()
+        service_account_key = create_service_account_key()
+        auths = [
+            KeyAuth(service_account_key, endpoint.url, token_registry=registry, refresh_policy=policy)
+            for _ in range(instances)
+        ]
+        initial_requests = endpoint.request_count
+        tokens = set()
+        tokens_lock = threading.Lock()
+        deadline = time.monotonic() + cycles * token_lifetime / 2
+
+        def worker(index: int):
+            request = FakeRequest()
+            while time.monotonic() < deadline:
+                auths[index % instances](request)
+                with tokens_lock:
+                    tokens.add(request.headers["Authorization"])
+
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        refreshes = endpoint.request_count - initial_requests
+        observed_cycles = max(len(tokens) - 1, 1)
+        return {
+            "instances": instances,
+            "threads": threads,
+            "token_lifetime_s": token_lifetime,
+            "refresh_cycles": observed_cycles,
+            "endpoint_requests": refreshes,
+            "requests_per_cycle": refreshes / observed_cycles,
+            "requests_by_grant_type": dict(endpoint.requests),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20_000, help="KeyAuth.__call__ calls per thread")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--iterations", type=int, default=50, help="iterations of the latency benchmarks")
+    parser.add_argument("--cycles", type=int, default=4, help="refresh cycles to observe")
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    with LocalTokenEndpoint() as endpoint, tempfile.TemporaryDirectory() as directory:
+        key_files = write_key_files(Path(directory))
+        results["authorization_init"] = bench_authorization_init(endpoint, key_files, args.iterations)
+        results["key_auth_init"] = bench_key_auth_init(endpoint, args.iterations)
+        results["key_auth_call"] = bench_key_auth_call(endpoint, args.threads, args.calls)
+        results["refresh_latency"] = bench_refresh_latency(endpoint, args.iterations)
+    results["refresh_cycle"] = bench_refresh_cycle(token_lifetime=2, cycles=args.cycles, instances=15, threads=8)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Measure how long authenticating many service account keys takes against a local stand-in token endpoint.
+
+Compares creating one KeyAuth after the other with CredentialPool.authenticate(),
+which signs the assertions as a batch and fetches at most --max-concurrency
+tokens at the same time. The endpoint runs in its own process and answers after
+--latency-ms to stand in for the network. Results are printed as JSON.
+
+Usage: python -m benchmarks.bulk [--keys 16 64 256] [--max-concurrency 32] [--latency-ms 20] [--output results.json]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from benchmarks.common import create_service_account_key
+from benchmarks.token_endpoint import token_endpoint_process
+from stackit.core.auth_methods.credential_pool import CredentialPool
+from stackit.core.auth_methods.key_auth import KeyAuth
+from stackit.core.auth_methods.service_account_key import ServiceAccountKey
+from stackit.core.auth_methods.token_provider import TokenRegistry
+
+
+def bench_serial(token_endpoint: str, keys: List[ServiceAccountKey]) -> float:
+    registry = TokenRegistry()
+    start = time.perf_counter()
+    auths = [KeyAuth(key, token_endpoint, token_registry=registry) for key in keys]
+    duration = time.perf_counter() - start
+    for auth in auths:
+        auth.close()
+    return duration
+
+
+def bench_bulk(token_endpoint: str, keys: List[ServiceAccountKey], max_concurrency: int) -> float:
+    with CredentialPool(token_endpoint=token_endpoint, max_concurrency=max_concurrency) as pool:
+        start = time.perf_counter()
+        result = pool.authenticate(keys)
+        duration = time.perf_counter() - start
+    if result.errors:
+        raise RuntimeError(f"Authenticating {len(result.errors)} keys failed: {next(iter(result.errors.values()))}")
+    return duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--max-concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # Every identity gets its own key id, signing costs the same with a shared private key
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    results: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "max_concurrency": args.max_concurrency,
+        "latency_ms": args.latency_ms,
+        "keys": {},
+    }
+    with token_endpoint_process(latency=args.latency_ms / 1000) as token_endpoint:
+        for count in args.keys:
+            serial_keys = [create_service_account_key(f"serial-{count}-{i}", private_key) for i in range(count)]
+            bulk_keys = [create_service_account_key(f"bulk-{count}-{i}", private_key) for i in range(count)]
+            serial = bench_serial(token_endpoint, serial_keys)
+            bulk = bench_bulk(token_endpoint, bulk_keys, args.max_concurrency)
+            results["keys"][count] = {
+                "serial_ms": serial * 1000,
+                "bulk_ms": bulk * 1000,
+                "speedup": serial / bulk,
+            }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
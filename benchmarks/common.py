@@ -0,0 +1,104 @@
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric.types import PrivateKeyTypes
+
+from stackit.core.auth_methods.service_account_key import ServiceAccountKey
+
+
+class FakeRequest:
+    """The parts of a PreparedRequest that KeyAuth uses, without collecting a hook per call"""
+
+    def __init__(self):
+        self.url = "https://dns.api.stackit.cloud/v1/zones"
+        self.headers = {}
+        self.body = None
+        self.hook = None
+
+    def register_hook(self, event, hook):
+        self.hook = hook
+
+
+def create_service_account_key_json(
+    key_id: str = "benchmark-kid", private_key: Optional[PrivateKeyTypes] = None, key_algorithm: str = "RSA_2048"
+) -> Tuple[str, str]:
+    """:return: The service account key JSON without private key and the PEM private key"""
+    if private_key is None:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    public_pem = (
+        private_key.public_key()
+        .public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+        .decode()
+    )
+    key_json = json.dumps(
+        {
+            "id": key_id,
+            "publicKey": public_pem,
+            "createdAt": "2024-01-01T00:00:00+00:00",
+            "keyType": "USER_MANAGED",
+            "keyOrigin": "GENERATED",
+            "keyAlgorithm": key_algorithm,
+            "active": True,
+            "credentials": {
+                "kid": key_id,
+                "iss": "benchmark@sa.stackit.cloud",
+                "sub": "benchmark",
+                "aud": "https://stackit-service-account-prod.apps.01.cf.eu01.stackit.cloud",
+            },
+        }
+    )
+    return key_json, private_pem
+
+
+def create_service_account_key(
+    key_id: str = "benchmark-kid", private_key: Optional[PrivateKeyTypes] = None, key_algorithm: str = "RSA_2048"
+) -> ServiceAccountKey:
+    key_json, private_pem = create_service_account_key_json(key_id, private_key, key_algorithm)
+    service_account_key = ServiceAccountKey.model_validate_json(key_json)
+    service_account_key.credentials.private_key = private_pem
+    return service_account_key
+
+
+def write_key_files(directory: Path, private_key: Optional[PrivateKeyTypes] = None) -> Dict[str, str]:
+    """:return: Paths of a credentials file, a service account key file and a private key file"""
+    key_json, private_pem = create_service_account_key_json(private_key=private_key)
+    paths = {
+        "credentials_file_path": directory / "credentials.json",
+        "service_account_key_path": directory / "account.key",
+        "private_key_path": directory / "private.key",
+    }
+    paths["credentials_file_path"].write_text("{}")
+    paths["service_account_key_path"].write_text(key_json)
+    paths["private_key_path"].write_text(private_pem)
+    return {name: str(path) for name, path in paths.items()}
+
+
+def time_calls(fn: Callable[[], object], iterations: int) -> List[float]:
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    """:return: Statistics of the durations in milliseconds"""
+    ordered = sorted(durations)
+    return {
+        "iterations": len(ordered),
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
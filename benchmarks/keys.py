@@ -0,0 +1,90 @@
+"""Compare parsing service account key files into the pydantic model and the compact form.
+
+Parses the same key files, each with its own key id and private key PEM, with
+ServiceAccountKey.model_validate_json() and with CompactServiceAccountKey.from_json().
+It reports the parse time per key and the memory the parsed keys retain, as
+traced by tracemalloc, and prints the results as JSON.
+
+Usage: python -m benchmarks.keys [--keys N] [--repeat N] [--output results.json]
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from benchmarks.common import create_service_account_key_json
+from stackit.core.auth_methods.service_account_key import CompactServiceAccountKey, ServiceAccountKey
+
+
+def create_key_files(count: int) -> List[bytes]:
+    # Signing is not measured, so all keys share one private key but carry their own copy of its PEM
+    key_json, private_pem = create_service_account_key_json(
+        private_key=rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    )
+    key_files = []
+    for i in range(count):
+        key = json.loads(key_json)
+        key["id"] = key["credentials"]["kid"] = f"benchmark-kid-{i}"
+        key["credentials"]["privateKey"] = private_pem
+        key_files.append(json.dumps(key).encode())
+    return key_files
+
+
+def measure(parse: Callable[[bytes], Any], key_files: List[bytes], repeat: int) -> Dict[str, Any]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for key_file in key_files:
+            parse(key_file)
+        durations.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    keys = [parse(key_file) for key_file in key_files]
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del keys
+    return {
+        "parse_us_per_key": min(durations) / len(key_files) * 1_000_000,
+        "retained_bytes_per_key": (after - before) / len(key_files),
+        "retained_mb": (after - before) / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5, help="parse time is the best of this many runs")
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    key_files = create_key_files(args.keys)
+    model = measure(ServiceAccountKey.model_validate_json, key_files, args.repeat)
+    compact = measure(CompactServiceAccountKey.from_json, key_files, args.repeat)
+    results: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "keys": args.keys,
+        "model": model,
+        "compact": compact,
+        "parse_speedup": model["parse_us_per_key"] / compact["parse_us_per_key"],
+        "memory_ratio": model["retained_bytes_per_key"] / compact["retained_bytes_per_key"],
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Check that creating and closing Authorizations does not leak threads or memory.
+
+Every cycle creates an Authorization from key files, authenticates a request,
+which fetches a token from a local stand-in token endpoint and schedules its
+refresh, and closes the Authorization again. The live thread count and the
+memory traced by tracemalloc are sampled along the way and printed as JSON.
+With --max-growth-kb the exit status is non-zero once either grows after the
+warm-up cycles.
+
+Usage: python -m benchmarks.lifecycle [--cycles N] [--max-growth-kb KB] [--output results.json]
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List
+
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from benchmarks.common import FakeRequest, write_key_files
+from benchmarks.token_endpoint import LocalTokenEndpoint
+from stackit.core.authorization import Authorization
+from stackit.core.configuration import Configuration, EnvironmentVariables
+
+WARM_UP_CYCLES = 200
+
+
+def create_and_close(key_files: Dict[str, str], cycles: int) -> None:
+    for _ in range(cycles):
+        with Authorization(Configuration(**key_files)) as authorization:
+            authorization.auth_method(FakeRequest())
+
+
+def sample(cycles: int) -> Dict[str, Any]:
+    gc.collect()
+    traced, _ = tracemalloc.get_traced_memory()
+    return {"cycles": cycles, "threads": threading.active_count(), "traced_kb": traced / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=10_000)
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--max-growth-kb", type=float, help="fail once traced memory grows by more than this")
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    samples: List[Dict[str, Any]] = []
+    with LocalTokenEndpoint() as endpoint, tempfile.TemporaryDirectory() as directory:
+        os.environ[EnvironmentVariables.TOKEN_BASEURL_ENV] = endpoint.url
+        # Ed25519 signs fastest, so the cycles are dominated by the lifecycle itself
+        key_files = write_key_files(Path(directory), ed25519.Ed25519PrivateKey.generate())
+        # Starts the shared threads and fills the caches
+        create_and_close(key_files, WARM_UP_CYCLES)
+        tracemalloc.start()
+        start = time.perf_counter()
+        samples.append(sample(0))
+        step = max(args.cycles // args.samples, 1)
+        for done in range(step, args.cycles + 1, step):
+            create_and_close(key_files, step)
+            samples.append(sample(done))
+        duration = time.perf_counter() - start
+        tracemalloc.stop()
+
+    results: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cycle_ms": duration / samples[-1]["cycles"] * 1000,
+        "thread_growth": samples[-1]["threads"] - samples[0]["threads"],
+        "traced_growth_kb": samples[-1]["traced_kb"] - samples[0]["traced_kb"],
+        "samples": samples,
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    sys.stdout.write(output + "\n")
+
+    if args.max_growth_kb is not None:
+        if results["thread_growth"] > 0:
+            sys.exit(f"{results['thread_growth']} threads were leaked")
+        if results["traced_growth_kb"] > args.max_growth_kb:
+            sys.exit(f"Traced memory grew by {results['traced_growth_kb']:.0f} KB, limit is {args.max_growth_kb} KB")
+
+
+if __name__ == "__main__":
+    main()
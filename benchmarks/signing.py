@@ -0,0 +1,59 @@
+"""Compare the cost of signing token assertions with different key types.
+
+Assertions are signed by create_assertion() with the algorithm derived from
+each key, with the parsed private key cached as in production. Results are
+printed as JSON.
+
+Usage: python -m benchmarks.signing [--iterations N] [--output results.json]
+"""
+
+import argparse
+import functools
+import json
+import platform
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from cryptography.hazmat.primitives.asymmetric.types import PrivateKeyTypes
+
+from benchmarks.common import create_service_account_key, summarize, time_calls
+from stackit.core.auth_methods.assertion import create_assertion, load_private_key, signing_algorithm
+
+KEYS: Dict[str, Callable[[], PrivateKeyTypes]] = {
+    "RSA_2048": lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    "RSA_3072": lambda: rsa.generate_private_key(public_exponent=65537, key_size=3072),
+    "RSA_4096": lambda: rsa.generate_private_key(public_exponent=65537, key_size=4096),
+    "EC_P256": lambda: ec.generate_private_key(ec.SECP256R1()),
+    "EC_P384": lambda: ec.generate_private_key(ec.SECP384R1()),
+    "ED25519": ed25519.Ed25519PrivateKey.generate,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "create_assertion": {},
+    }
+    for key_algorithm, generate_private_key in KEYS.items():
+        service_account_key = create_service_account_key(key_algorithm, generate_private_key(), key_algorithm)
+        algorithm = signing_algorithm(load_private_key(service_account_key.credentials.private_key))
+        create_assertion(service_account_key)
+        summary = summarize(time_calls(functools.partial(create_assertion, service_account_key), args.iterations))
+        results["create_assertion"][key_algorithm] = {"algorithm": algorithm, **summary}
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Measure how long importing stackit.core takes in a fresh interpreter.
+
+Every run starts a new interpreter with ``python -X importtime``, imports
+stackit.core.authorization and creates an Authorization with a service account
+token, the way short-lived CLI tools and serverless functions do. Results are
+printed as JSON. With --max-import-ms the exit status is non-zero once the
+median import time exceeds the limit or a heavy dependency is loaded eagerly.
+
+Usage: python -m benchmarks.startup [--runs N] [--max-import-ms MS] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess  # noqa: S404 runs the current interpreter only
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+HEAVY_MODULES = ("requests", "jwt", "cryptography", "pydantic")
+# Only needed for key based authentication
+KEY_AUTH_MODULES = ("jwt", "cryptography", "pydantic")
+MODULE = "stackit.core.authorization"
+SCRIPT = f"""
+import json, sys
+from {MODULE} import Authorization
+from stackit.core.configuration import Configuration
+imported = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+Authorization(Configuration(service_account_token="token", credentials_file_path=sys.argv[1]))
+created = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(json.dumps({{"after_import": imported, "after_token_auth": created}}))
+"""
+
+
+def run_once(credentials_file_path: str) -> Tuple[float, Dict[str, List[str]]]:
+    """:return: Cumulative import time of MODULE in milliseconds and the heavy modules loaded"""
+    result = subprocess.run(  # noqa: S603 fixed arguments
+        [sys.executable, "-X", "importtime", "-c", SCRIPT, credentials_file_path],
+        capture_output=True,
+        text=True,
+        check=True,
+        # Same module search path as this interpreter, so an uninstalled checkout works too
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(path for path in sys.path if path)},
+    )
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    cumulative = next(
+        int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and line.split("|")[2].strip() == MODULE
+    )
+    return cumulative / 1000, json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-import-ms", type=float, help="fail above this median import time")
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    durations = []
+    modules: Dict[str, List[str]] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        credentials_file = Path(directory) / "credentials.json"
+        credentials_file.write_text("{}")
+        for _ in range(args.runs):
+            duration, modules = run_once(str(credentials_file))
+            durations.append(duration)
+    results: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "module": MODULE,
+        "import_ms": {
+            "runs": len(durations),
+            "median": statistics.median(durations),
+            "min": min(durations),
+            "max": max(durations),
+        },
+        "heavy_modules": modules,
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    sys.stdout.write(output + "\n")
+
+    if args.max_import_ms is not None:
+        if results["import_ms"]["median"] > args.max_import_ms:
+            sys.exit(
+                f"Importing {MODULE} took {results['import_ms']['median']:.1f} ms, limit is {args.max_import_ms} ms"
+            )
+        if modules["after_import"]:
+            sys.exit(f"Importing {MODULE} loaded {', '.join(modules['after_import'])}")
+        key_auth_modules = [module for module in modules["after_token_auth"] if module in KEY_AUTH_MODULES]
+        if key_auth_modules:
+            sys.exit(f"Token authentication loaded {', '.join(key_auth_modules)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import collections
+import contextlib
+import json
+import multiprocessing
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.connection import Connection
+from typing import Counter, Iterator, Optional
+from urllib.parse import parse_qs
+
+import jwt
+
+SIGNING_SECRET = "not-a-real-secret-only-used-for-benchmarks"
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many clients connect at once when tokens are fetched in parallel
+    request_queue_size = 1024
+
+
+class LocalTokenEndpoint:
+    """Stand-in for the STACKIT token endpoint on localhost.
+
+    It answers both the jwt-bearer and the refresh_token grant with HS256 tokens
+    valid for token_lifetime seconds and counts requests per grant type.
+    """
+
+    def __init__(self, token_lifetime: float = 3600, latency: float = 0):
+        self.token_lifetime = token_lifetime
+        self.latency = latency
+        self.requests: Counter[str] = collections.Counter()
+        self.__lock = threading.Lock()
+        self.__server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}/token"
+
+    @property
+    def request_count(self) -> int:
+        with self.__lock:
+            return sum(self.requests.values())
+
+    def __enter__(self) -> "LocalTokenEndpoint":
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so pooled sessions can reuse their connections
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, do not let Nagle delay the body
+            disable_nagle_algorithm = True
+
+            def do_POST(self):  # noqa: N802 name given by BaseHTTPRequestHandler
+                form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+                body = endpoint.handle(form.get("grant_type", [""])[0]).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = Server(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def handle(self, grant_type: str) -> str:
+        with self.__lock:
+            self.requests[grant_type] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        now = time.time()
+        access_token = jwt.encode({"iat": now, "exp": now + self.token_lifetime}, SIGNING_SECRET, algorithm="HS256")
+        refresh_token = jwt.encode(
+            {"iat": now, "exp": now + 10 * self.token_lifetime}, SIGNING_SECRET, algorithm="HS256"
+        )
+        return json.dumps(
+            {
+                "access_token": access_token,
+                "refresh_token": refresh_token,
+                "token_type": "Bearer",
+                "scope": "",
+                "expires_in": int(self.token_lifetime),
+            }
+        )
+
+
+def _serve(token_lifetime: float, latency: float, connection: Connection) -> None:
+    with LocalTokenEndpoint(token_lifetime, latency) as endpoint:
+        connection.send(endpoint.url)
+        # Serve until the parent asks to stop
+        connection.recv()
+
+
+@contextlib.contextmanager
+def token_endpoint_process(token_lifetime: float = 3600, latency: float = 0) -> Iterator[str]:
+    """Run a LocalTokenEndpoint in a separate process, so it does not compete for the GIL of the benchmark.
+
+    :return: The URL of the endpoint
+    """
+    connection, child_connection = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve, args=(token_lifetime, latency, child_connection), daemon=True)
+    process.start()
+    try:
+        yield connection.recv()
+    finally:
+        connection.send(None)
+        process.join()
@@ -0,0 +1,164 @@
+import functools
+import logging
+import threading
+import uuid
+from concurrent import futures
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec, ed448, ed25519, rsa
+from cryptography.hazmat.primitives.asymmetric.types import PrivateKeyTypes
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+from stackit.core.auth_methods.service_account_key import AnyServiceAccountKey
+from stackit.core.auth_methods.token_state import SYSTEM_CLOCK, Clock
+from stackit.core.fork import register_after_fork
+
+ASSERTION_VALIDITY = timedelta(minutes=10)
+JWT_BEARER_GRANT_TYPE = "urn:ietf:params:oauth:grant-type:jwt-bearer"
+EC_SIGNING_ALGORITHMS = {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512", "secp256k1": "ES256K"}
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=256)
+def load_private_key(private_key: str) -> PrivateKeyTypes:
+    """Parse a PEM private key once instead of on every signature."""
+    return load_pem_private_key(private_key.encode(), password=None)
+
+
+def signing_algorithm(private_key: PrivateKeyTypes) -> str:
+    """Return the JWS algorithm for signing with a private key.
+
+    RSA keys sign with RS512 as before, EC keys with the ECDSA algorithm of their curve
+    and Ed25519 and Ed448 keys with EdDSA, which are much cheaper than RSA signatures.
+    """
+    if isinstance(private_key, rsa.RSAPrivateKey):
+        return "RS512"
+    if isinstance(private_key, ec.EllipticCurvePrivateKey) and private_key.curve.name in EC_SIGNING_ALGORITHMS:
+        return EC_SIGNING_ALGORITHMS[private_key.curve.name]
+    if isinstance(private_key, (ed25519.Ed25519PrivateKey, ed448.Ed448PrivateKey)):
+        return "EdDSA"
+    raise ValueError(f"Private keys of type {type(private_key).__name__} cannot sign assertions")
+
+
+def create_assertion(service_account_key: AnyServiceAccountKey, algorithm: Optional[str] = None) -> str:
+    """Sign the JWT assertion that is exchanged for an access token at the token endpoint.
+
+    :param algorithm: JWS algorithm, derived from the private key by default, see signing_algorithm()
+    """
+    private_key = load_private_key(service_account_key.credentials.private_key)
+    now = datetime.utcnow()
+    payload = {
+        "iss": service_account_key.credentials.issuer,
+        "sub": service_account_key.credentials.subject,
+        "aud": service_account_key.credentials.audience,
+        "jti": str(uuid.uuid4()),
+        "iat": now,
+        "exp": now + ASSERTION_VALIDITY,
+    }
+    headers = {"kid": str(service_account_key.credentials.key_id)}
+    return jwt.encode(
+        payload,
+        private_key,
+        headers=headers,
+        algorithm=algorithm if algorithm else signing_algorithm(private_key),
+    )
+
+
+class AssertionSigner:
+    """Signs assertions ahead of time, so fetching a token only has to wait for the network.
+
+    prepare() starts signing an assertion in the background, take() hands it out
+    once as long as it stays valid for MIN_VALIDITY and otherwise signs one inline.
+    Assertions carry a unique jti, so each one is only used for a single request.
+    Signatures run on the given executor. A ProcessPoolExecutor spreads them over
+    all CPU cores when many keys need a new assertion at the same time.
+    """
+
+    MIN_VALIDITY = timedelta(minutes=2)
+    DEFAULT_MAX_WORKERS = 2
+
+    def __init__(
+        self, executor: Optional[Executor] = None, clock: Clock = SYSTEM_CLOCK, algorithm: Optional[str] = None
+    ):
+        """
+        :param algorithm: JWS algorithm, derived from the private key by default, see signing_algorithm()
+        """
+        self.clock = clock
+        self.algorithm = algorithm
+        self.__executor = executor
+        self.__owns_executor = executor is None
+        self.__lock = threading.Lock()
+        # Assertion being signed or signed per key, with the time it expires
+        self.__prepared: Dict[Tuple[str, Optional[str]], Tuple[futures.Future, float]] = {}
+        register_after_fork(self)
+
+    def prepare(self, service_account_key: AnyServiceAccountKey) -> None:
+        """Start signing the next assertion of a key, unless one is prepared already."""
+        self.prepare_many([service_account_key])
+
+    def prepare_many(self, service_account_keys: Iterable[AnyServiceAccountKey]) -> None:
+        with self.__lock:
+            now = self.clock.time()
+            # Drop assertions of keys that are no longer used
+            for key, entry in list(self.__prepared.items()):
+                if entry[1] <= now:
+                    del self.__prepared[key]
+            for service_account_key in service_account_keys:
+                key = self.__key(service_account_key)
+                entry = self.__prepared.get(key)
+                if entry is not None and self.__is_usable(entry, now):
+                    continue
+                self.__prepared[key] = (
+                    self.__get_executor().submit(create_assertion, service_account_key, self.algorithm),
+                    now + ASSERTION_VALIDITY.total_seconds(),
+                )
+
+    def take(self, service_account_key: AnyServiceAccountKey) -> str:
+        """Return the prepared assertion of a key, or sign one if none is usable."""
+        with self.__lock:
+            entry = self.__prepared.pop(self.__key(service_account_key), None)
+        if entry is not None and self.__is_usable(entry, self.clock.time()):
+            try:
+                return entry[0].result()
+            except Exception as e:
+                logger.warning("Signing assertion in the background failed: %s", e)
+        return create_assertion(service_account_key, self.algorithm)
+
+    def after_fork(self) -> None:
+        """Called in a forked child process, see register_after_fork.
+
+        Assertions still being signed in the parent are dropped. An executor passed in is kept,
+        replacing it is up to the caller.
+        """
+        self.__lock = threading.Lock()
+        self.__prepared = {}
+        if self.__owns_executor:
+            self.__executor = None
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__prepared)
+
+    def __is_usable(self, entry: Tuple[futures.Future, float], now: float) -> bool:
+        return now + self.MIN_VALIDITY.total_seconds() < entry[1]
+
+    def __get_executor(self) -> Executor:
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(self.DEFAULT_MAX_WORKERS, thread_name_prefix="stackit-assertion")
+        return self.__executor
+
+    @staticmethod
+    def __key(service_account_key: AnyServiceAccountKey) -> Tuple[str, Optional[str]]:
+        credentials = service_account_key.credentials
+        return credentials.key_id, credentials.private_key
+
+
+_default_signer = AssertionSigner()
+
+
+def get_default_assertion_signer() -> AssertionSigner:
+    return _default_signer
@@ -0,0 +1,251 @@
+import asyncio
+import functools
+import logging
+import math
+import random
+import time
+from typing import Any, AsyncGenerator, Dict, Generator, Optional
+
+import requests
+
+from stackit.core.auth_methods.assertion import (
+    JWT_BEARER_GRANT_TYPE,
+    AssertionSigner,
+    get_default_assertion_signer,
+)
+from stackit.core.auth_methods.key_auth import KeyAuth
+from stackit.core.auth_methods.service_account_key import AnyServiceAccountKey
+from stackit.core.auth_methods.token_provider import (
+    TokenProvider,
+    TokenUnavailableError,
+    get_default_token_registry,
+)
+from stackit.core.auth_methods.token_retry import (
+    DEFAULT_RETRY_POLICY,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+)
+from stackit.core.auth_methods.token_state import (
+    DEFAULT_REFRESH_POLICY,
+    RefreshPolicy,
+    TokenState,
+)
+from stackit.core.http_session import get_default_session
+
+try:
+    import httpx
+except ImportError:  # httpx is optional, without it token requests run on the default executor
+    httpx = None
+
+AsyncAuthBase: Any = httpx.Auth if httpx is not None else object
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncKeyAuth(AsyncAuthBase):
+    """Asyncio counterpart of KeyAuth.
+
+    It plugs into httpx.AsyncClient(auth=...) or provides the header through
+    get_authorization_header() for any other client. The first token is fetched
+    on first use and refreshes run as a single asyncio task per instance.
+    Assertions are signed on the default executor, so signing does not block
+    the event loop. Failed token requests are retried and paused like those of
+    TokenProvider, and after a failed refresh no other is started for a while.
+    """
+
+    DEFAULT_TOKEN_ENDPOINT = KeyAuth.DEFAULT_TOKEN_ENDPOINT
+
+    timeout: Optional[int] = 30
+    token_endpoint: str
+    service_account_key: AnyServiceAccountKey
+    refresh_policy: RefreshPolicy
+    assertion_signer: AssertionSigner
+    retry_policy: RetryPolicy
+    circuit_breaker: CircuitBreaker
+
+    def __init__(
+        self,
+        service_account_key: AnyServiceAccountKey,
+        token_endpoint: Optional[str] = None,
+        http_client: Optional["httpx.AsyncClient"] = None,
+        refresh_policy: Optional[RefreshPolicy] = None,
+        assertion_signer: Optional[AssertionSigner] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+    ):
+        """
+        :param retry_policy: Whether and when failed token requests are retried.
+        :param circuit_breaker: Pauses token requests while the token endpoint keeps failing. By default
+            the one shared with all KeyAuth instances of the token endpoint.
+        """
+        self.service_account_key = service_account_key
+        self.token_endpoint = token_endpoint if token_endpoint else self.DEFAULT_TOKEN_ENDPOINT
+        self.refresh_policy = refresh_policy if refresh_policy else DEFAULT_REFRESH_POLICY
+        self.assertion_signer = assertion_signer if assertion_signer is not None else get_default_assertion_signer()
+        self.retry_policy = retry_policy if retry_policy is not None else DEFAULT_RETRY_POLICY
+        self.circuit_breaker = (
+            circuit_breaker
+            if circuit_breaker is not None
+            else get_default_token_registry().circuit_breaker(self.token_endpoint)
+        )
+        self.__http_client = http_client
+        self.__owns_http_client = False
+        self.__access_token_state = TokenState.from_token(None)
+        self.__refresh_token_state = TokenState.from_token(None)
+        self.__refresh_task: Optional[asyncio.Task] = None
+        # Refreshes are held back until then after a refresh failed
+        self.__retry_at = -math.inf
+
+    @property
+    def access_token(self) -> Optional[str]:
+        return self.__access_token_state.token
+
+    @property
+    def refresh_token(self) -> Optional[str]:
+        return self.__refresh_token_state.token
+
+    async def get_authorization_header(self) -> str:
+        """
+        :raises TokenUnavailableError: No token was ever fetched, or the token expired and no new one was fetched
+        """
+        token_state = self.__access_token_state
+        now = time.monotonic()
+        if now < token_state.refresh_at:
+            return token_state.authorization_header
+        refresh_task = self.__schedule_refresh(now)
+        if now < token_state.expires_at:
+            return token_state.authorization_header
+        if refresh_task is not None:
+            # The token is no longer valid, so wait for the in-flight refresh
+            await asyncio.shield(refresh_task)
+        new_token_state = self.__access_token_state
+        if new_token_state.token is None or new_token_state is token_state:
+            raise TokenUnavailableError(f"Fetching a token from {self.token_endpoint} failed")
+        return new_token_state.authorization_header
+
+    async def async_auth_flow(self, request: "httpx.Request") -> AsyncGenerator["httpx.Request", "httpx.Response"]:
+        request.headers["Authorization"] = await self.get_authorization_header()
+        yield request
+
+    def sync_auth_flow(self, request: "httpx.Request") -> Generator["httpx.Request", "httpx.Response", None]:
+        raise RuntimeError(f"{type(self).__name__} can only be used with httpx.AsyncClient, use KeyAuth instead")
+
+    async def aclose(self) -> None:
+        if self.__refresh_task is not None:
+            self.__refresh_task.cancel()
+        if self.__owns_http_client:
+            await self.__http_client.aclose()
+            self.__http_client = None
+            self.__owns_http_client = False
+
+    def __schedule_refresh(self, now: float) -> Optional[asyncio.Task]:
+        """:return: The in-flight refresh, if any"""
+        loop = asyncio.get_running_loop()
+        refresh_task = self.__refresh_task
+        if refresh_task is not None and not refresh_task.done() and refresh_task.get_loop() is loop:
+            return refresh_task
+        if now < self.__retry_at:
+            return None
+        refresh_task = self.__refresh_task = loop.create_task(self.__refresh())
+        return refresh_task
+
+    async def __refresh(self) -> None:
+        token_state = self.__access_token_state
+        try:
+            if self.__refresh_token_state.needs_refresh():
+                response_json = await self.__request_token(JWT_BEARER_GRANT_TYPE, "Initial token fetch failed")
+                if response_json is not None:
+                    self.__store_tokens(response_json["access_token"], response_json["refresh_token"])
+                return
+            response_json = await self.__request_token("refresh_token", "Token refresh failed")
+            if response_json is not None:
+                self.__store_tokens(response_json.get("access_token"))
+        finally:
+            if self.__access_token_state is token_state:
+                # Try again later instead of on every request, see TokenProvider
+                jitter = random.uniform(0.5, 1)  # noqa: S311 not used for security
+                self.__retry_at = time.monotonic() + TokenProvider.REFRESH_RETRY_INTERVAL.total_seconds() * jitter
+
+    def __store_tokens(self, access_token: Optional[str], refresh_token: Optional[str] = None) -> None:
+        self.__access_token_state = TokenState.from_token(access_token, self.refresh_policy)
+        if refresh_token is not None:
+            self.__refresh_token_state = TokenState.from_token(refresh_token, self.refresh_policy)
+
+    async def __create_body(self, grant_type: str) -> Dict[str, str]:
+        if grant_type == "refresh_token":
+            return {"grant_type": grant_type, "refresh_token": self.refresh_token}
+        # Every attempt gets a fresh assertion, taken from the signer off the event loop as it may sign one
+        assertion = await asyncio.get_running_loop().run_in_executor(
+            None, self.assertion_signer.take, self.service_account_key
+        )
+        return {"grant_type": grant_type, "assertion": assertion}
+
+    async def __request_token(self, grant_type: str, failure_message: str) -> Optional[Dict[str, Any]]:
+        """Post to the token endpoint, retrying as the RetryPolicy allows.
+
+        :return: The response, or None if all attempts failed
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            body = await self.__create_body(grant_type)
+            try:
+                return await self.__post_token_request(body)
+            except requests.RequestException as e:
+                delay = self.retry_policy.delay(attempt, e)
+                if delay is None:
+                    logger.warning("%s: %s", failure_message, e)
+                    return None
+                logger.info("%s, retrying in %.1f s: %s", failure_message, delay, e)
+                await asyncio.sleep(delay)
+
+    async def __post_token_request(self, body: Dict[str, str]) -> Dict[str, Any]:
+        if not self.circuit_breaker.allow():
+            raise CircuitOpenError(f"Requests to {self.token_endpoint} are paused after repeated failures")
+        try:
+            response_json = await self.__post(body)
+        except requests.RequestException as e:
+            # Only failures that suggest an outage count, a rejected request shows that the endpoint is up
+            if self.retry_policy.is_retryable(e):
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+            raise
+        except BaseException:
+            # Like a cancelled task, which must not leave a trial request of the circuit breaker running
+            self.circuit_breaker.record_aborted()
+            raise
+        self.circuit_breaker.record_success()
+        return response_json
+
+    async def __post(self, body: Dict[str, str]) -> Dict[str, Any]:
+        """:raises requests.RequestException: Also for errors of httpx, so RetryPolicy can judge them"""
+        if httpx is None:
+            post = functools.partial(get_default_session().post, self.token_endpoint, data=body, timeout=self.timeout)
+            response = await asyncio.get_running_loop().run_in_executor(None, post)
+            response.raise_for_status()
+            return response.json()
+        if self.__http_client is None:
+            self.__http_client = httpx.AsyncClient()
+            self.__owns_http_client = True
+        try:
+            response = await self.__http_client.post(self.token_endpoint, data=body, timeout=self.timeout)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(str(e)) from e
+        except httpx.TooManyRedirects as e:
+            raise requests.TooManyRedirects(str(e)) from e
+        except httpx.DecodingError as e:
+            raise requests.exceptions.ContentDecodingError(str(e)) from e
+        except httpx.RequestError as e:
+            raise requests.RequestException(str(e)) from e
+        if response.is_error:
+            # The status code and Retry-After header are read from the httpx response
+            raise requests.HTTPError(f"{response.status_code} error from {self.token_endpoint}", response=response)
+        try:
+            return response.json()
+        except ValueError as e:
+            # Like requests.Response.json()
+            raise requests.exceptions.InvalidJSONError(f"Invalid JSON from {self.token_endpoint}: {e}") from e
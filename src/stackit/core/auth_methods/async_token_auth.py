@@ -0,0 +1,23 @@
+from typing import TYPE_CHECKING, AsyncGenerator, Generator
+
+from stackit.core.auth_methods.async_key_auth import AsyncAuthBase
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class AsyncTokenAuth(AsyncAuthBase):
+    __access_token: str
+
+    def __init__(self, token: str):
+        self.__access_token = token
+
+    async def get_authorization_header(self) -> str:
+        return f"Bearer {self.__access_token}"
+
+    async def async_auth_flow(self, request: "httpx.Request") -> AsyncGenerator["httpx.Request", "httpx.Response"]:
+        request.headers["Authorization"] = await self.get_authorization_header()
+        yield request
+
+    def sync_auth_flow(self, request: "httpx.Request") -> Generator["httpx.Request", "httpx.Response", None]:
+        raise RuntimeError(f"{type(self).__name__} can only be used with httpx.AsyncClient, use TokenAuth instead")
@@ -0,0 +1,270 @@
+import math
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import requests
+
+from stackit.core.auth_methods.assertion import AssertionSigner, get_default_assertion_signer
+from stackit.core.auth_methods.instrumentation import TokenInstrumentation
+from stackit.core.auth_methods.key_auth import KeyAuth, TokenUnavailableError
+from stackit.core.auth_methods.refresh_scheduler import RefreshScheduler
+from stackit.core.auth_methods.service_account_key import (
+    AnyServiceAccountKey,
+    CompactServiceAccountKey,
+    ServiceAccountKey,
+)
+from stackit.core.auth_methods.token_cache import FileTokenCache
+from stackit.core.auth_methods.token_provider import TokenRegistry
+from stackit.core.auth_methods.token_retry import RetryPolicy
+from stackit.core.auth_methods.token_state import SYSTEM_CLOCK, Clock, RefreshPolicy
+from stackit.core.file_cache import get_default_file_cache
+from stackit.core.fork import register_after_fork
+from stackit.core.http_session import DEFAULT_POOL_MAXSIZE, create_session
+
+
+class BulkAuthentication:
+    """Outcome of authenticating many keys at once, see CredentialPool.authenticate()."""
+
+    # Handles with a token by key id
+    auths: Dict[str, KeyAuth]
+    # Why no token was fetched by key id
+    errors: Dict[str, Exception]
+
+    def __init__(self, auths: Dict[str, KeyAuth], errors: Dict[str, Exception]):
+        self.auths = auths
+        self.errors = errors
+
+
+class CredentialPool:
+    """Hands out KeyAuth handles for many service account keys, e.g. one per tenant.
+
+    All tokens of a pool are refreshed by a single RefreshScheduler, whose
+    max_concurrency threads also run the initial fetches, see prefetch(). Handles
+    are created lazily on first use. The pool lets go of handles that were not
+    requested for idle_timeout and of the least recently requested ones beyond
+    max_size. A token is dropped once no handle of its key is left.
+    """
+
+    DEFAULT_MAX_CONCURRENCY = 8
+
+    def __init__(
+        self,
+        service_account_keys: Iterable[AnyServiceAccountKey] = (),
+        token_endpoint: Optional[str] = None,
+        http_session: Optional[requests.Session] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_size: Optional[int] = None,
+        idle_timeout: Optional[timedelta] = None,
+        refresh_policy: Optional[RefreshPolicy] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        token_cache: Optional[FileTokenCache] = None,
+        instrumentation: Optional[TokenInstrumentation] = None,
+        assertion_signer: Optional[AssertionSigner] = None,
+        clock: Clock = SYSTEM_CLOCK,
+    ):
+        """
+        :param max_concurrency: Number of tokens fetched or refreshed at the same time. Without an
+            http_session, tokens are fetched through a session pooling that many connections.
+        :param assertion_signer: Signs the assertions of all keys, e.g. with a ProcessPoolExecutor
+            to use all CPU cores for prefetch().
+        :param max_size: Number of handles kept, the least recently requested ones are released beyond.
+        :param idle_timeout: Release handles that were not requested for this long.
+        """
+        self.token_endpoint = token_endpoint
+        self.__owns_http_session = http_session is None and max_concurrency > DEFAULT_POOL_MAXSIZE
+        if self.__owns_http_session:
+            # The default session would discard the connections beyond its pool size after each use
+            http_session = create_session(pool_maxsize=max_concurrency)
+        self.http_session = http_session
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.refresh_policy = refresh_policy
+        self.retry_policy = retry_policy
+        self.token_cache = token_cache
+        self.instrumentation = instrumentation
+        self.assertion_signer = assertion_signer if assertion_signer is not None else get_default_assertion_signer()
+        self.clock = clock
+        self.__scheduler = RefreshScheduler(max_workers=max_concurrency)
+        self.__registry = TokenRegistry(self.__scheduler, clock)
+        self.__lock = threading.Lock()
+        self.__keys: Dict[str, AnyServiceAccountKey] = {}
+        # Handles by key id with the time they were last requested, least recently requested first
+        self.__handles: "OrderedDict[str, Tuple[KeyAuth, float]]" = OrderedDict()
+        register_after_fork(self)
+        for service_account_key in service_account_keys:
+            self.add(service_account_key)
+
+    @classmethod
+    def from_directory(
+        cls, directory: Union[str, Path], pattern: str = "*.json", trusted: bool = False, **kwargs
+    ) -> "CredentialPool":
+        """Create a pool of all service account key files in directory, which must contain their private key.
+
+        :param trusted: Load the key files as CompactServiceAccountKey, which checks only the fields
+            needed to authenticate and takes less memory, instead of fully validating them. Loading
+            is not faster, this only reduces the memory a large pool takes.
+        """
+        file_cache = get_default_file_cache()
+        read = cls.__read_compact_service_account_key if trusted else cls.__read_service_account_key
+        service_account_keys = []
+        for path in sorted(Path(directory).glob(pattern)):
+            service_account_key = file_cache.get(path, read)
+            if service_account_key.credentials.private_key is None:
+                raise ValueError(f"Service account key file has no private key: {path}")
+            service_account_keys.append(service_account_key)
+        return cls(service_account_keys, **kwargs)
+
+    def add(self, service_account_key: AnyServiceAccountKey) -> None:
+        """Add a key or replace the key with the same key id. No token is fetched yet."""
+        key_id = service_account_key.credentials.key_id
+        with self.__lock:
+            self.__keys[key_id] = service_account_key
+            if key_id in self.__handles and self.__handles[key_id][0].service_account_key is not service_account_key:
+                del self.__handles[key_id]
+
+    def remove(self, key_id: str) -> None:
+        with self.__lock:
+            del self.__keys[key_id]
+            self.__handles.pop(key_id, None)
+
+    def get(self, key_id: str) -> KeyAuth:
+        """Return the auth handle of a key. A new handle fetches its token on first use.
+
+        :raises KeyError: No key with this key id was added
+        """
+        now = self.clock.monotonic()
+        with self.__lock:
+            entry = self.__handles.pop(key_id, None)
+            handle = entry[0] if entry is not None else self.__create_handle(self.__keys[key_id])
+            self.__handles[key_id] = (handle, now)
+            self.__evict(now)
+        return handle
+
+    def __getitem__(self, key_id: str) -> KeyAuth:
+        return self.get(key_id)
+
+    def prefetch(self, key_ids: Optional[Iterable[str]] = None, wait: bool = True) -> None:
+        """Fetch the tokens of the given keys, or of all keys, in parallel.
+
+        The assertions of all keys are signed up front as a batch, then at most
+        max_concurrency tokens are fetched at the same time.
+        """
+        handles = self.__start_all(key_ids)
+        if wait:
+            for handle in handles:
+                handle.start(wait=True)
+
+    def authenticate(self, service_account_keys: Iterable[AnyServiceAccountKey]) -> BulkAuthentication:
+        """Add keys and fetch their tokens in parallel, like prefetch().
+
+        The time taken grows with the number of keys divided by max_concurrency. Keys
+        whose token could not be fetched are kept in the pool and retried on first use.
+        """
+        key_ids = []
+        for service_account_key in service_account_keys:
+            self.add(service_account_key)
+            key_ids.append(service_account_key.credentials.key_id)
+        auths: Dict[str, KeyAuth] = {}
+        errors: Dict[str, Exception] = {}
+        for key_id, handle in zip(key_ids, self.__start_all(key_ids)):
+            error = None
+            try:
+                handle.start(wait=True)
+            except Exception as e:
+                error = e
+            if handle.access_token is not None:
+                auths[key_id] = handle
+                continue
+            # Whether the fetch failed while it was awaited here or before, it recorded why
+            errors[key_id] = (
+                handle.last_error or error or TokenUnavailableError(f"Fetching a token for {key_id} failed")
+            )
+        return BulkAuthentication(auths, errors)
+
+    def evict_idle(self) -> None:
+        with self.__lock:
+            self.__evict(self.clock.monotonic())
+
+    def close(self) -> None:
+        """Release the handles held by the pool and cancel the scheduled refreshes of all its tokens.
+
+        A session the pool created itself is closed as well.
+        """
+        with self.__lock:
+            self.__handles.clear()
+        self.__scheduler.close()
+        if self.__owns_http_session:
+            self.http_session.close()
+
+    def after_fork(self) -> None:
+        """Called in a forked child process, see register_after_fork."""
+        self.__lock = threading.Lock()
+        if self.__owns_http_session:
+            # Connections of the parent must not be shared with it, the session opens new ones on next use
+            self.http_session.close()
+
+    def __enter__(self) -> "CredentialPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __contains__(self, key_id: str) -> bool:
+        with self.__lock:
+            return key_id in self.__keys
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__keys)
+
+    def __start_all(self, key_ids: Optional[Iterable[str]]) -> List[KeyAuth]:
+        now = self.clock.monotonic()
+        handles: List[KeyAuth] = []
+        with self.__lock:
+            for key_id in list(self.__keys) if key_ids is None else key_ids:
+                entry = self.__handles.pop(key_id, None)
+                handle = entry[0] if entry is not None else self.__create_handle(self.__keys[key_id])
+                self.__handles[key_id] = (handle, now)
+                handles.append(handle)
+            self.__evict(now)
+        self.assertion_signer.prepare_many(
+            handle.service_account_key for handle in handles if handle.access_token is None
+        )
+        for handle in handles:
+            handle.start(wait=False)
+        return handles
+
+    def __create_handle(self, service_account_key: AnyServiceAccountKey) -> KeyAuth:
+        return KeyAuth(
+            service_account_key,
+            self.token_endpoint,
+            self.http_session,
+            token_registry=self.__registry,
+            lazy=True,
+            refresh_policy=self.refresh_policy,
+            token_cache=self.token_cache,
+            instrumentation=self.instrumentation,
+            retry_policy=self.retry_policy,
+            assertion_signer=self.assertion_signer,
+        )
+
+    def __evict(self, now: float) -> None:
+        idle_since = now - self.idle_timeout.total_seconds() if self.idle_timeout is not None else -math.inf
+        while self.__handles:
+            last_used = next(iter(self.__handles.values()))[1]
+            if last_used > idle_since and (self.max_size is None or len(self.__handles) <= self.max_size):
+                break
+            self.__handles.popitem(last=False)
+
+    @staticmethod
+    def __read_service_account_key(path: str) -> ServiceAccountKey:
+        with open(path, "r") as f:
+            return ServiceAccountKey.model_validate_json(f.read())
+
+    @staticmethod
+    def __read_compact_service_account_key(path: str) -> CompactServiceAccountKey:
+        with open(path, "rb") as f:
+            return CompactServiceAccountKey.from_json(f.read())
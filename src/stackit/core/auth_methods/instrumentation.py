@@ -0,0 +1,38 @@
+from typing import Optional
+
+REFRESH_FROM_ENDPOINT = "endpoint"
+REFRESH_FROM_CACHE = "cache"
+REFRESH_FAILED = "failed"
+
+
+class TokenInstrumentation:
+    """Receives measurements of the token handling, e.g. to record metrics or trace spans.
+
+    Override the methods of interest, the defaults do nothing. They are called
+    from request threads as well as from the refresh threads, so implementations
+    must be thread safe and must not raise. Durations are in seconds.
+    """
+
+    def token_requested(
+        self, grant_type: str, duration: float, status_code: Optional[int], error: Optional[Exception]
+    ) -> None:
+        """A request to the token endpoint finished. status_code is None if no response was received."""
+
+    def token_refreshed(self, source: str, duration: float, expires_in: float) -> None:
+        """A refresh finished.
+
+        :param source: REFRESH_FROM_ENDPOINT, REFRESH_FROM_CACHE if another process already refreshed
+            the token, or REFRESH_FAILED
+        :param expires_in: Time until the current token expires
+        """
+
+    def token_used(self, wait: float, refreshed: bool, expires_in: float) -> None:
+        """KeyAuth attached a token to a request.
+
+        :param wait: Time spent getting the token, including waiting for locks and an in-flight refresh
+        :param refreshed: The request waited for a new token instead of using the current one
+        :param expires_in: Time until the attached token expires
+        """
+
+
+NO_INSTRUMENTATION = TokenInstrumentation()
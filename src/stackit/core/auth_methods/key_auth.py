@@ -1,162 +1,214 @@
-import atexit
-import threading
+import functools
 import time
-import uuid
-from concurrent import futures
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime, timedelta
-from typing import Optional
+import weakref
+from typing import Any, Optional
+from urllib.parse import urlsplit
 
-import jwt
 import requests
-from pydantic import BaseModel, ConfigDict, Field
-from requests import Request
+from requests import PreparedRequest, Response
 from requests.auth import AuthBase
-
-
-class ServiceAccountKeyCredentials(BaseModel):
-    model_config = ConfigDict(strict=True, populate_by_name=True)
-
-    audience: str = Field(alias="aud")
-    issuer: str = Field(alias="iss")
-    key_id: str = Field(alias="kid")
-    private_key: Optional[str] = Field(None, alias="privateKey")
-    subject: str = Field(alias="sub")
-
-
-class ServiceAccountKey(BaseModel):
-    model_config = ConfigDict(strict=True)
-
-    active: bool
-    created_at: datetime = Field(alias="createdAt")
-    credentials: ServiceAccountKeyCredentials
-    id: str
-    key_algorithm: str = Field(alias="keyAlgorithm")
-    key_origin: str = Field(alias="keyOrigin")
-    key_type: str = Field(alias="keyType")
-    public_key: str = Field(alias="publicKey")
-    valid_until: Optional[datetime] = Field(None, alias="validUntil")
+from requests.cookies import extract_cookies_to_jar
+
+from stackit.core.auth_methods.assertion import AssertionSigner
+from stackit.core.auth_methods.instrumentation import TokenInstrumentation
+from stackit.core.auth_methods.service_account_key import (  # noqa: F401 re-exported
+    AnyServiceAccountKey,
+    CompactServiceAccountKey,
+    ServiceAccountKey,
+    ServiceAccountKeyCredentials,
+)
+from stackit.core.auth_methods.token_cache import FileTokenCache
+from stackit.core.auth_methods.token_provider import (  # noqa: F401 re-exported
+    TokenRegistry,
+    TokenUnavailableError,
+    get_default_token_registry,
+)
+from stackit.core.auth_methods.token_retry import RetryPolicy
+from stackit.core.auth_methods.token_state import RefreshPolicy, TokenState
+from stackit.core.http_session import get_default_session
 
 
 class KeyAuth(AuthBase):
     DEFAULT_TOKEN_ENDPOINT = "https://service-account.api.stackit.cloud/token"  # noqa S105 false positive
-    TOKEN_EXPIRY_CHECK_INTERVAL = timedelta(seconds=60)
-    EXPIRATION_LEEWAY = timedelta(minutes=5)
 
-    timeout: Optional[int] = 30
-    initial_token: Optional[str]
-    access_token: Optional[str]
-    refresh_token: Optional[str]
     token_endpoint: str
-    token_expiry_check_interval: int
-    lock: threading.Lock
-    executor: ThreadPoolExecutor
-    refresh_future: Optional[futures.Future]
-    service_account_key: ServiceAccountKey
+    service_account_key: AnyServiceAccountKey
 
     def __init__(
         self,
-        service_account_key: ServiceAccountKey,
+        service_account_key: AnyServiceAccountKey,
         token_endpoint: Optional[str] = None,
+        http_session: Optional[requests.Session] = None,
+        token_registry: Optional[TokenRegistry] = None,
+        lazy: bool = False,
+        prefetch: bool = False,
+        refresh_policy: Optional[RefreshPolicy] = None,
+        token_cache: Optional[FileTokenCache] = None,
+        instrumentation: Optional[TokenInstrumentation] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        assertion_signer: Optional[AssertionSigner] = None,
     ):
+        """
+        :param lazy: Return without waiting for the first token. It is fetched on the first request,
+            or in the background right away if prefetch is set.
+        :param prefetch: Start fetching the first token in the background when lazy is set.
+        :param refresh_policy: When to refresh the token ahead of its expiry.
+        :param token_cache: Share the token with other processes on this host through files.
+        :param instrumentation: Receives measurements of token requests, refreshes and token use.
+        :param retry_policy: Whether and when failed token requests are retried.
+        :param assertion_signer: Signs the assertions exchanged for new tokens ahead of time.
+        :raises TokenUnavailableError: On requests, if no token could be fetched.
+        """
         self.service_account_key = service_account_key
         self.token_endpoint = token_endpoint if token_endpoint else self.DEFAULT_TOKEN_ENDPOINT
-        self.lock = threading.Lock()
-        self.executor = ThreadPoolExecutor(max_workers=1)
-        self.access_token = None
-        self.refresh_future = None
-        self.__create_initial_token()
-        self.__fetch_token_from_endpoint()
-        self.__start_token_refresh_task()
-
-        atexit.register(self.__shutdown)
-
-    def __call__(self, r: Request) -> Request:
-        with self.lock:
-            if self.__is_token_expired(self.access_token):
-                if self.refresh_future is None or self.refresh_future.done():
-                    self.refresh_future = self.executor.submit(self.__refresh_token)
-            r.headers["Authorization"] = f"Bearer {self.access_token}"
+        self.__registry = token_registry if token_registry is not None else get_default_token_registry()
+        self.__provider_options = (
+            http_session if http_session else get_default_session(),
+            refresh_policy,
+            token_cache,
+            instrumentation,
+            retry_policy,
+            assertion_signer,
+        )
+        self.__provider = self.__registry.acquire(service_account_key, self.token_endpoint, *self.__provider_options)
+        # Without instrumentation requests take the plain path and nothing is measured
+        self.__instrumentation = instrumentation
+        # Gives the shared token back to the registry once this instance is garbage collected
+        self.__release = weakref.finalize(self, self.__registry.release, self.__provider)
+        self.__closed = False
+        if not lazy or prefetch:
+            # Started outside the registry lock, so fetching one identity does not block the others
+            self.__provider.start(wait=not lazy)
+
+    def __call__(self, r: PreparedRequest) -> PreparedRequest:
+        if self.__closed:
+            # The token is no longer refreshed, so it would be sent until and after it expires
+            raise RuntimeError(f"{type(self).__name__} is closed and cannot authenticate requests")
+        if self.__instrumentation is not None:
+            token_state = self.__current_token_state_instrumented()
+        else:
+            # Reading the token state is lock-free unless the token has expired and a refresh must be awaited
+            token_state = self.__provider.current_token_state()
+        r.headers["Authorization"] = token_state.authorization_header
+        body_position = self.__body_position(r.body) if r.body is not None else None
+        r.register_hook("response", functools.partial(self.__handle_401, token_state, body_position, r.url))
         return r
 
-    def __create_initial_token(self) -> None:
-        payload = {
-            "iss": self.service_account_key.credentials.issuer,
-            "sub": self.service_account_key.credentials.subject,
-            "aud": self.service_account_key.credentials.audience,
-            "jti": str(uuid.uuid4()),
-            "iat": datetime.utcnow(),
-            "exp": datetime.utcnow() + timedelta(minutes=10),
-        }
-        headers = {"kid": str(self.service_account_key.credentials.key_id)}
-        self.initial_token = jwt.encode(
-            payload,
-            self.service_account_key.credentials.private_key,
-            headers=headers,
-            algorithm="RS512",
-        )
+    def start(self, wait: bool = True) -> None:
+        """Fetch the first token unless that already happened, for instances created with lazy set."""
+        self.__provider.start(wait)
 
-    def __fetch_token_from_endpoint(self) -> None:
-        body = {
-            "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
-            "assertion": self.initial_token,
-        }
-        try:
-            response = requests.post(self.token_endpoint, data=body, timeout=self.timeout)
-            response.raise_for_status()
-            response_json = response.json()
-            self.access_token = response_json["access_token"]
-            self.refresh_token = response_json["refresh_token"]
-        except requests.RequestException as e:
-            print(f"Initial token fetch failed: {e}")
-
-    def __start_token_refresh_task(self):
-        def token_refresh_task():
-            while True:
-                time.sleep(self.TOKEN_EXPIRY_CHECK_INTERVAL.total_seconds())
-                with self.lock:
-                    if self.__is_token_expired(self.access_token) and (
-                        self.refresh_future is None or self.refresh_future.done()
-                    ):
-                        self.refresh_future = self.executor.submit(self.__refresh_token)
-
-        thread = threading.Thread(target=token_refresh_task)
-        thread.daemon = True
-        thread.start()
-
-    def __refresh_token(self):
-        if self.__is_token_expired(self.refresh_token):
-            self.__create_initial_token()
-            self.__fetch_token_from_endpoint()
-            return
+    def close(self) -> None:
+        """Give the token back to the registry, whose refreshes stop once no other instance uses it.
+
+        The http session is left open, as it is usually shared. Authenticating requests
+        with a closed instance raises RuntimeError. Closing again does nothing.
+        """
+        self.__closed = True
+        self.__release()
+
+    def __enter__(self) -> "KeyAuth":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
-        body = {
-            "grant_type": "refresh_token",
-            "refresh_token": self.refresh_token,
-        }
+    def replace_key(self, service_account_key: AnyServiceAccountKey) -> None:
+        """Sign future token requests with another key, e.g. after the key file was rotated.
 
+        A key with the same key id keeps the current token. For a new key id a token
+        is fetched first and requests switch over to it once it is available, so
+        requests sent with the current token are not interrupted.
+
+        :raises TokenUnavailableError: No token could be fetched with a new key id, the current key is kept
+        """
+        if service_account_key.credentials.key_id == self.service_account_key.credentials.key_id:
+            self.__provider.service_account_key = service_account_key
+            self.service_account_key = service_account_key
+            return
+        provider = self.__registry.acquire(service_account_key, self.token_endpoint, *self.__provider_options)
         try:
-            response = requests.post(self.token_endpoint, data=body, timeout=self.timeout)
-            response.raise_for_status()
-            response_data = response.json()
-            new_token = response_data.get("access_token")
-            # with self.lock:
-            self.access_token = new_token
-            print("Token successfully refreshed!")
-        except requests.RequestException as e:
-            print(f"Token refresh failed: {e}")
-
-    def __is_token_expired(self, token: str) -> bool:
+            provider.start(wait=True)
+            if provider.access_token is None:
+                raise TokenUnavailableError(f"Fetching a token from {self.token_endpoint} failed")
+        except BaseException:
+            self.__registry.release(provider)
+            raise
+        release, self.__release = self.__release, weakref.finalize(self, self.__registry.release, provider)
+        self.__provider = provider
+        self.service_account_key = service_account_key
+        release()
+
+    def __current_token_state_instrumented(self) -> TokenState:
+        start = time.perf_counter()
+        previous_token_state = self.__provider.access_token_state
+        token_state = self.__provider.current_token_state()
+        self.__instrumentation.token_used(
+            time.perf_counter() - start,
+            token_state is not previous_token_state,
+            token_state.expires_at - self.__provider.clock.monotonic(),
+        )
+        return token_state
+
+    def __handle_401(
+        self, token_state: TokenState, body_position: Optional[int], url: str, r: Response, **kwargs: Any
+    ) -> Response:
+        """Replay a request rejected with 401 once with a new token, see TokenProvider.invalidate.
+
+        Requests keep this hook when they follow redirects, so only requests that still
+        carry the token and go to the host it was attached for are replayed.
+        """
+        if r.status_code != 401:
+            return r
+        if r.request.headers.get("Authorization") != token_state.authorization_header:
+            return r
+        if urlsplit(r.request.url).netloc != urlsplit(url).netloc:
+            return r
+        new_token_state = self.__provider.invalidate(token_state)
+        if new_token_state.token is None or new_token_state.token == token_state.token:
+            return r
+        body = r.request.body
+        if hasattr(body, "read"):
+            if body_position is None:
+                # A consumed stream cannot be sent again
+                return r
+            body.seek(body_position)
+
+        # Consume the content and release the original connection, so it can be reused
+        r.content
+        r.close()
+        request = r.request.copy()
+        extract_cookies_to_jar(request._cookies, r.request, r.raw)
+        request.prepare_cookies(request._cookies)
+        request.headers["Authorization"] = new_token_state.authorization_header
+        response = r.connection.send(request, **kwargs)
+        response.history.append(r)
+        response.request = request
+        return response
+
+    @staticmethod
+    def __body_position(body: Any) -> Optional[int]:
+        tell = getattr(body, "tell", None)
+        if tell is None:
+            return None
         try:
-            decoded_token = jwt.decode(token, options={"verify_signature": False})
-            exp = decoded_token.get("exp")
-            if exp:
-                return time.time() > (exp + self.EXPIRATION_LEEWAY.total_seconds())
-        except jwt.ExpiredSignatureError:
-            return True
-        except jwt.DecodeError:
-            return True
-        return False
-
-    def __shutdown(self):
-        self.executor.shutdown(wait=False)
+            return tell()
+        except OSError:
+            return None
+
+    @property
+    def http_session(self) -> requests.Session:
+        return self.__provider.http_session
+
+    @property
+    def access_token(self) -> Optional[str]:
+        return self.__provider.access_token
+
+    @property
+    def refresh_token(self) -> Optional[str]:
+        return self.__provider.refresh_token
+
+    @property
+    def last_error(self) -> Optional[Exception]:
+        """Why the last token fetch or refresh failed, None once one succeeded."""
+        return self.__provider.last_error
@@ -0,0 +1,140 @@
+import atexit
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+import weakref
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from stackit.core.fork import register_after_fork
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshScheduler:
+    """Runs token refreshes at their deadlines for any number of tokens from a single thread.
+
+    Deadlines are kept in a heap, so the thread sleeps until the next one is due.
+    The scheduler only keeps weak references to its targets, which are told
+    through target.refresh_due() that their deadline has passed. The refreshes
+    themselves run on a small shared thread pool, see submit().
+    """
+
+    DEFAULT_MAX_WORKERS = 4
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self.__condition = threading.Condition()
+        self.__heap: List[Tuple[float, int, weakref.ref]] = []
+        self.__sequence = itertools.count()
+        # Sequence number of the current heap entry per target, older entries are skipped
+        self.__entries: "weakref.WeakKeyDictionary[Any, int]" = weakref.WeakKeyDictionary()
+        self.__thread: Optional[threading.Thread] = None
+        self.__executor: Optional[ThreadPoolExecutor] = None
+        register_after_fork(self)
+
+    def schedule(self, target: Any, deadline: float) -> None:
+        """Call target.refresh_due() once time.monotonic() reaches deadline, replacing any earlier schedule."""
+        if not math.isfinite(deadline):
+            self.unschedule(target)
+            return
+        with self.__condition:
+            sequence = next(self.__sequence)
+            self.__entries[target] = sequence
+            heapq.heappush(self.__heap, (deadline, sequence, weakref.ref(target)))
+            self.__compact()
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name="stackit-token-scheduler", daemon=True)
+                self.__thread.start()
+            elif self.__heap[0][1] == sequence:
+                # The new deadline is the earliest one, so wake the thread up
+                self.__condition.notify()
+
+    def unschedule(self, target: Any) -> None:
+        with self.__condition:
+            self.__entries.pop(target, None)
+            self.__compact()
+
+    def deadline(self, target: Any) -> Optional[float]:
+        """The time.monotonic() at which target.refresh_due() is called, or None if target is not scheduled."""
+        with self.__condition:
+            sequence = self.__entries.get(target)
+            return next((entry[0] for entry in self.__heap if entry[1] == sequence), None)
+
+    def submit(self, fn: Callable[[], Any]) -> futures.Future:
+        with self.__condition:
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="stackit-token-refresh")
+            return self.__executor.submit(fn)
+
+    def close(self) -> None:
+        """Stop the scheduler thread and drop all schedules. Scheduling again starts a new thread."""
+        with self.__condition:
+            self.__heap.clear()
+            self.__entries.clear()
+            self.__thread = None
+            executor, self.__executor = self.__executor, None
+            self.__condition.notify_all()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def after_fork(self) -> None:
+        """Called in a forked child process, see register_after_fork.
+
+        Schedules are kept, the thread and the pool are started again on first use.
+        """
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__executor = None
+
+    def __len__(self) -> int:
+        with self.__condition:
+            return len(self.__entries)
+
+    def __compact(self) -> None:
+        # Replaced and unscheduled entries stay in the heap until they are due, drop them once they pile up
+        if len(self.__heap) <= 2 * len(self.__entries) + 64:
+            return
+        self.__heap = [entry for entry in self.__heap if self.__current_target(entry) is not None]
+        heapq.heapify(self.__heap)
+
+    def __current_target(self, entry: Tuple[float, int, weakref.ref]) -> Optional[Any]:
+        _, sequence, target_ref = entry
+        target = target_ref()
+        if target is None or self.__entries.get(target) != sequence:
+            return None
+        return target
+
+    def __run(self) -> None:
+        while True:
+            due = []
+            with self.__condition:
+                while not due:
+                    # close() detaches the thread from the scheduler
+                    if self.__thread is not threading.current_thread():
+                        return
+                    now = time.monotonic()
+                    while self.__heap and self.__heap[0][0] <= now:
+                        target = self.__current_target(heapq.heappop(self.__heap))
+                        if target is not None:
+                            del self.__entries[target]
+                            due.append(target)
+                    if not due:
+                        self.__condition.wait(self.__heap[0][0] - now if self.__heap else None)
+            for target in due:
+                try:
+                    target.refresh_due()
+                except Exception:
+                    logger.exception("Scheduled token refresh failed")
+
+
+_default_scheduler = RefreshScheduler()
+atexit.register(_default_scheduler.close)
+
+
+def get_default_refresh_scheduler() -> RefreshScheduler:
+    return _default_scheduler
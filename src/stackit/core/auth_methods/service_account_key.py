@@ -0,0 +1,156 @@
+import json
+import sys
+from datetime import datetime
+from typing import Any, Optional, Tuple, Union
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class ServiceAccountKeyCredentials(BaseModel):
+    model_config = ConfigDict(strict=True, populate_by_name=True)
+
+    audience: str = Field(alias="aud")
+    issuer: str = Field(alias="iss")
+    key_id: str = Field(alias="kid")
+    private_key: Optional[str] = Field(None, alias="privateKey")
+    subject: str = Field(alias="sub")
+
+
+class ServiceAccountKey(BaseModel):
+    model_config = ConfigDict(strict=True)
+
+    active: bool
+    created_at: datetime = Field(alias="createdAt")
+    credentials: ServiceAccountKeyCredentials
+    id: str
+    key_algorithm: str = Field(alias="keyAlgorithm")
+    key_origin: str = Field(alias="keyOrigin")
+    key_type: str = Field(alias="keyType")
+    public_key: str = Field(alias="publicKey")
+    valid_until: Optional[datetime] = Field(None, alias="validUntil")
+
+
+class CompactServiceAccountKeyCredentials:
+    """Immutable credentials of a CompactServiceAccountKey, see there."""
+
+    __slots__ = ("audience", "issuer", "key_id", "private_key", "subject")
+
+    audience: str
+    issuer: str
+    key_id: str
+    private_key: Optional[str]
+    subject: str
+
+    def __init__(self, audience: str, issuer: str, key_id: str, private_key: Optional[str], subject: str):
+        # All keys of a region share the audience, so it is stored once
+        object.__setattr__(self, "audience", sys.intern(audience))
+        object.__setattr__(self, "issuer", issuer)
+        object.__setattr__(self, "key_id", key_id)
+        object.__setattr__(self, "private_key", private_key)
+        object.__setattr__(self, "subject", subject)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return type(self), (self.audience, self.issuer, self.key_id, self.private_key, self.subject)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(key_id={self.key_id!r})"
+
+
+class CompactServiceAccountKey:
+    """Immutable, slotted form of a ServiceAccountKey for pools of many keys.
+
+    Only the fields needed to authenticate are kept, so it takes a fraction of the
+    memory of the pydantic model and can be used wherever a ServiceAccountKey is
+    expected for authentication. from_json() skips the full validation of the
+    model and only checks that the fields it keeps are present with the right
+    types, which suits key files from a trusted source. It saves memory, not
+    time: from_json() parses slower than ServiceAccountKey.model_validate_json().
+    """
+
+    __slots__ = ("active", "credentials", "id")
+
+    active: bool
+    credentials: CompactServiceAccountKeyCredentials
+    id: str
+
+    def __init__(self, active: bool, credentials: CompactServiceAccountKeyCredentials, id: str):
+        object.__setattr__(self, "active", active)
+        object.__setattr__(self, "credentials", credentials)
+        object.__setattr__(self, "id", id)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return type(self), (self.active, self.credentials, self.id)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(id={self.id!r}, key_id={self.credentials.key_id!r})"
+
+    @classmethod
+    def from_json(cls, data: Union[str, bytes]) -> "CompactServiceAccountKey":
+        """
+        :raises ValueError: data is no JSON object, or a kept field is missing or has the wrong type
+        """
+        key = json.loads(data)
+        credentials = _field(key, "credentials", dict)
+        return cls(
+            _field(key, "active", bool),
+            CompactServiceAccountKeyCredentials(
+                _field(credentials, "aud", str),
+                _field(credentials, "iss", str),
+                _field(credentials, "kid", str),
+                _field(credentials, "privateKey", str, required=False),
+                _field(credentials, "sub", str),
+            ),
+            _field(key, "id", str),
+        )
+
+    @classmethod
+    def from_model(cls, service_account_key: ServiceAccountKey) -> "CompactServiceAccountKey":
+        credentials = service_account_key.credentials
+        return cls(
+            service_account_key.active,
+            CompactServiceAccountKeyCredentials(
+                credentials.audience,
+                credentials.issuer,
+                credentials.key_id,
+                credentials.private_key,
+                credentials.subject,
+            ),
+            service_account_key.id,
+        )
+
+    def with_private_key(self, private_key: str) -> "CompactServiceAccountKey":
+        credentials = self.credentials
+        return type(self)(
+            self.active,
+            CompactServiceAccountKeyCredentials(
+                credentials.audience, credentials.issuer, credentials.key_id, private_key, credentials.subject
+            ),
+            self.id,
+        )
+
+
+# Either form of a service account key, both can be used to authenticate
+AnyServiceAccountKey = Union[ServiceAccountKey, CompactServiceAccountKey]
+
+
+def _field(obj: Any, name: str, expected_type: type, required: bool = True) -> Any:
+    if not isinstance(obj, dict):
+        raise ValueError(f"Expected a JSON object with field {name}")
+    value = obj.get(name)
+    if value is None and not required:
+        return None
+    if type(value) is not expected_type:
+        raise ValueError(f"Field {name} must be of type {expected_type.__name__}, got {type(value).__name__}")
+    return value
@@ -0,0 +1,95 @@
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import IO, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileTokenCache:
+    """Shares tokens between the processes of one host through files.
+
+    Every identity gets its own cache file, which is only ever replaced
+    atomically, and a lock file. A process holds the lock while it refreshes,
+    so the others wait and then read the refreshed token instead of fetching
+    their own.
+    """
+
+    DEFAULT_DIRECTORY = ".stackit/token-cache"
+
+    directory: Path
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = Path(directory) if directory else Path.home() / self.DEFAULT_DIRECTORY
+
+    def __eq__(self, other: object) -> bool:
+        # Caches of the same directory share their tokens, so a TokenRegistry treats them as one
+        return isinstance(other, FileTokenCache) and self.directory == other.directory
+
+    def __hash__(self) -> int:
+        return hash(self.directory)
+
+    def load(self, key_id: str, token_endpoint: str) -> Optional[Tuple[str, str]]:
+        """:return: The cached access and refresh token, if any"""
+        try:
+            with open(self.__path(key_id, token_endpoint), "r") as f:
+                content = json.load(f)
+            return content["access_token"], content["refresh_token"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def store(self, key_id: str, token_endpoint: str, access_token: str, refresh_token: str) -> None:
+        path = self.__path(key_id, token_endpoint)
+        self.__create_directory()
+        fd, temporary_path = tempfile.mkstemp(dir=self.directory, prefix=path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"access_token": access_token, "refresh_token": refresh_token}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(temporary_path)
+            raise
+
+    @contextlib.contextmanager
+    def lock(self, key_id: str, token_endpoint: str) -> Iterator[None]:
+        """Hold the exclusive inter-process lock of an identity."""
+        self.__create_directory()
+        path = self.__path(key_id, token_endpoint).with_suffix(".lock")
+        with open(os.open(path, os.O_RDWR | os.O_CREAT, 0o600), "r+") as f:
+            self.__lock_file(f)
+            try:
+                yield
+            finally:
+                self.__unlock_file(f)
+
+    def __path(self, key_id: str, token_endpoint: str) -> Path:
+        identity = hashlib.sha256(f"{key_id}\n{token_endpoint}".encode()).hexdigest()
+        return self.directory / f"{identity}.json"
+
+    def __create_directory(self) -> None:
+        # Tokens are credentials, so only the owner may read them
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    @staticmethod
+    def __lock_file(f: IO) -> None:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    @staticmethod
+    def __unlock_file(f: IO) -> None:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,531 @@
+import collections
+import logging
+import math
+import random
+import threading
+import time
+from concurrent import futures
+from datetime import timedelta
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+import requests
+
+from stackit.core.auth_methods.assertion import (
+    JWT_BEARER_GRANT_TYPE,
+    AssertionSigner,
+    get_default_assertion_signer,
+)
+from stackit.core.auth_methods.instrumentation import (
+    NO_INSTRUMENTATION,
+    REFRESH_FAILED,
+    REFRESH_FROM_CACHE,
+    REFRESH_FROM_ENDPOINT,
+    TokenInstrumentation,
+)
+from stackit.core.auth_methods.refresh_scheduler import RefreshScheduler, get_default_refresh_scheduler
+from stackit.core.auth_methods.service_account_key import AnyServiceAccountKey
+from stackit.core.auth_methods.token_cache import FileTokenCache
+from stackit.core.auth_methods.token_retry import (
+    DEFAULT_RETRY_POLICY,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+)
+from stackit.core.auth_methods.token_state import (
+    DEFAULT_REFRESH_POLICY,
+    SYSTEM_CLOCK,
+    Clock,
+    RefreshPolicy,
+    TokenState,
+)
+from stackit.core.fork import register_after_fork
+
+logger = logging.getLogger(__name__)
+
+
+class TokenUnavailableError(Exception):
+    """No token could be fetched from the token endpoint."""
+
+
+class TokenProvider:
+    """Fetches and refreshes the access token of a single service account key.
+
+    A provider is shared by all KeyAuth instances using the same key and token
+    endpoint, see TokenRegistry. Tokens are refreshed ahead of their expiry as
+    decided by the RefreshPolicy, timed by a RefreshScheduler or triggered by
+    the first request that sees a token due for refresh.
+
+    The current token is an immutable TokenState that refreshes publish by
+    replacing a single reference, so requests read it without taking a lock.
+    Only refreshes coordinate through the lock, and at most one runs at a time,
+    see schedule_refresh.
+    """
+
+    REFRESH_RETRY_INTERVAL = timedelta(seconds=60)
+    # A token rejected by the server is replaced at most once within this interval
+    INVALIDATION_INTERVAL = timedelta(seconds=30)
+    # How long before a refresh that needs a new assertion the assertion is signed
+    PRESIGN_LEAD = timedelta(seconds=60)
+
+    timeout: Optional[int] = 30
+    initial_token: Optional[str]
+    token_endpoint: str
+    http_session: requests.Session
+    lock: threading.Lock
+    scheduler: RefreshScheduler
+    refresh_policy: RefreshPolicy
+    token_cache: Optional[FileTokenCache]
+    clock: Clock
+    instrumentation: TokenInstrumentation
+    retry_policy: RetryPolicy
+    circuit_breaker: CircuitBreaker
+    assertion_signer: AssertionSigner
+    refresh_future: Optional[futures.Future]
+    # Why the last refresh failed, None once one succeeded
+    last_error: Optional[Exception]
+    service_account_key: AnyServiceAccountKey
+
+    def __init__(
+        self,
+        service_account_key: AnyServiceAccountKey,
+        token_endpoint: str,
+        http_session: requests.Session,
+        scheduler: Optional[RefreshScheduler] = None,
+        refresh_policy: Optional[RefreshPolicy] = None,
+        clock: Clock = SYSTEM_CLOCK,
+        token_cache: Optional[FileTokenCache] = None,
+        instrumentation: Optional[TokenInstrumentation] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        assertion_signer: Optional[AssertionSigner] = None,
+    ):
+        self.service_account_key = service_account_key
+        self.token_endpoint = token_endpoint
+        self.http_session = http_session
+        self.scheduler = scheduler if scheduler is not None else get_default_refresh_scheduler()
+        self.refresh_policy = refresh_policy if refresh_policy else DEFAULT_REFRESH_POLICY
+        self.clock = clock
+        self.token_cache = token_cache
+        self.instrumentation = instrumentation if instrumentation is not None else NO_INSTRUMENTATION
+        self.retry_policy = retry_policy if retry_policy is not None else DEFAULT_RETRY_POLICY
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker(clock=clock)
+        self.assertion_signer = assertion_signer if assertion_signer is not None else get_default_assertion_signer()
+        self.lock = threading.Lock()
+        self.initial_token = None
+        self.refresh_future = None
+        self.last_error = None
+        self.__access_token_state = TokenState.from_token(None)
+        self.__refresh_token_state = TokenState.from_token(None)
+        # Refreshes triggered by requests are held back until then after a refresh failed
+        self.__retry_at = -math.inf
+        self.__invalidated_at = -math.inf
+        # Set while the scheduler is due to call refresh_due() to sign an assertion before refreshing at this time
+        self.__presign_refresh_at: Optional[float] = None
+        self.__closed = False
+        register_after_fork(self)
+
+    @property
+    def access_token_state(self) -> TokenState:
+        return self.__access_token_state
+
+    @property
+    def access_token(self) -> Optional[str]:
+        return self.__access_token_state.token
+
+    @property
+    def refresh_token(self) -> Optional[str]:
+        return self.__refresh_token_state.token
+
+    def current_token_state(self) -> TokenState:
+        """Return the token to use for a request.
+
+        A token due for refresh is still returned while it is valid and the refresh runs in
+        the background. Once it has expired, callers wait for the in-flight refresh.
+
+        :raises TokenUnavailableError: No token was ever fetched, or the token expired and no new one was fetched
+        """
+        token_state = self.__access_token_state
+        now = self.clock.monotonic()
+        if now < token_state.refresh_at:
+            return token_state
+        if now < token_state.expires_at:
+            self.schedule_refresh()
+            return token_state
+        expired_token_state = token_state
+        token_state = self.wait_for_token()
+        # Also when the refresh failed or is held back after a failure, an expired token is never handed out
+        if token_state.token is None or token_state is expired_token_state:
+            raise TokenUnavailableError(f"Fetching a token from {self.token_endpoint} failed")
+        return token_state
+
+    def start(self, wait: bool = True) -> None:
+        """Fetch the first token unless that already happened, refreshes are scheduled from then on.
+
+        Concurrent callers share the same in-flight fetch. With wait=False the fetch runs in the background.
+        """
+        refresh_future = self.schedule_refresh()
+        if wait and refresh_future is not None:
+            refresh_future.result()
+
+    def wait_for_token(self) -> TokenState:
+        self.start(wait=True)
+        return self.__access_token_state
+
+    def invalidate(self, token_state: TokenState) -> TokenState:
+        """Replace a token that the server rejected before its expiry, e.g. because it was revoked.
+
+        Callers that were rejected with the same token share a single refresh, later ones get
+        the replacement right away. Within INVALIDATION_INTERVAL no further token is replaced,
+        so a server that also rejects new tokens does not cause a token fetch per request.
+
+        :return: The token to retry with, which is the rejected one if it could not be replaced
+        """
+        with self.lock:
+            refresh_future = self.refresh_future
+            if refresh_future is not None and refresh_future.done():
+                refresh_future = None
+            if self.__access_token_state is token_state and refresh_future is None:
+                now = self.clock.monotonic()
+                if self.__closed or now < self.__invalidated_at + self.INVALIDATION_INTERVAL.total_seconds():
+                    return token_state
+                self.__invalidated_at = now
+                # A revoked access token likely means a revoked refresh token, so a new assertion is used
+                self.__refresh_token_state = TokenState.from_token(None)
+                refresh_future = self.refresh_future = self.scheduler.submit(self.__run_refresh)
+        if refresh_future is not None:
+            refresh_future.result()
+        return self.__access_token_state
+
+    def close(self) -> None:
+        with self.lock:
+            self.__closed = True
+        self.scheduler.unschedule(self)
+
+    def after_fork(self) -> None:
+        """Called in a forked child process, see register_after_fork.
+
+        The inherited token is kept while it is valid, so forked workers do not all fetch one.
+        """
+        self.lock = threading.Lock()
+        # The refresh in flight in the parent does not run in this process
+        self.refresh_future = None
+        token_state = self.__access_token_state
+        if token_state.token is not None and math.isfinite(token_state.expires_at):
+            # Draw the jitter again, so workers forked from one parent do not all refresh at the same time
+            refresh_at = self.refresh_policy.refresh_at(token_state.issued_at, token_state.expires_at)
+            self.__access_token_state = TokenState(
+                token_state.token, token_state.issued_at, token_state.expires_at, refresh_at
+            )
+            # The scheduler still has the deadline of the parent, it was reset before this provider
+            if not self.__closed and refresh_at > self.clock.monotonic():
+                self.__schedule_next_refresh(refreshed=True)
+
+    def refresh_due(self) -> None:
+        with self.lock:
+            refresh_at, self.__presign_refresh_at = self.__presign_refresh_at, None
+            if refresh_at is not None and not self.__closed:
+                self.assertion_signer.prepare(self.service_account_key)
+                self.scheduler.schedule(self, refresh_at)
+                return
+        self.schedule_refresh(force=True)
+
+    def schedule_refresh(self, force: bool = False) -> Optional[futures.Future]:
+        """Submit a refresh if the token is due for one (or force is set) and none is running.
+
+        :return: The in-flight refresh, if any
+        """
+        with self.lock:
+            if self.refresh_future is not None and not self.refresh_future.done():
+                return self.refresh_future
+            if self.__closed:
+                return None
+            now = self.clock.monotonic()
+            if force or (self.__access_token_state.needs_refresh(now) and now >= self.__retry_at):
+                self.refresh_future = self.scheduler.submit(self.__run_refresh)
+                return self.refresh_future
+            return None
+
+    def __run_refresh(self) -> None:
+        start = time.perf_counter()
+        token_state = self.__access_token_state
+        source = REFRESH_FAILED
+        try:
+            if self.token_cache is None:
+                self.__refresh_token()
+                source = REFRESH_FROM_ENDPOINT
+            else:
+                source = self.__refresh_token_through_cache()
+        except Exception as e:
+            self.last_error = e
+            raise
+        finally:
+            refreshed = self.__access_token_state is not token_state
+            if refreshed:
+                self.last_error = None
+            self.__schedule_next_refresh(refreshed)
+        self.instrumentation.token_refreshed(
+            source if refreshed else REFRESH_FAILED,
+            time.perf_counter() - start,
+            self.__access_token_state.expires_at - self.clock.monotonic(),
+        )
+
+    def __schedule_next_refresh(self, refreshed: bool) -> None:
+        with self.lock:
+            if self.__closed:
+                return
+            now = self.clock.monotonic()
+            refresh_at = self.__access_token_state.refresh_at
+            if not refreshed or refresh_at <= now:
+                # Try again later instead of on every request, at different times in different processes
+                retry_interval = self.REFRESH_RETRY_INTERVAL.total_seconds() * random.uniform(0.5, 1)  # noqa: S311
+                refresh_at = self.__retry_at = now + retry_interval
+            deadline = refresh_at
+            self.__presign_refresh_at = None
+            if self.__refresh_token_state.needs_refresh(refresh_at):
+                # The next refresh needs a new assertion, sign it ahead so the refresh only waits for the network
+                presign_at = refresh_at - self.PRESIGN_LEAD.total_seconds()
+                if presign_at > now:
+                    deadline, self.__presign_refresh_at = presign_at, refresh_at
+                else:
+                    self.assertion_signer.prepare(self.service_account_key)
+            self.scheduler.schedule(self, deadline)
+
+    def __refresh_token_through_cache(self) -> str:
+        """:return: Where the token came from, see TokenInstrumentation.token_refreshed"""
+        key_id = self.service_account_key.credentials.key_id
+        try:
+            with self.token_cache.lock(key_id, self.token_endpoint):
+                # Another process may have refreshed the token while we waited for the lock
+                if self.__load_cached_tokens():
+                    return REFRESH_FROM_CACHE
+                token_state = self.__access_token_state
+                self.__refresh_token()
+                if self.__access_token_state is not token_state:
+                    try:
+                        self.token_cache.store(key_id, self.token_endpoint, self.access_token, self.refresh_token)
+                    except OSError as e:
+                        logger.warning("Storing token in cache failed: %s", e)
+        except OSError as e:
+            logger.warning("Token cache is unavailable: %s", e)
+            self.__refresh_token()
+        return REFRESH_FROM_ENDPOINT
+
+    def __load_cached_tokens(self) -> bool:
+        cached_tokens = self.token_cache.load(self.service_account_key.credentials.key_id, self.token_endpoint)
+        if cached_tokens is None or cached_tokens[0] == self.access_token:
+            return False
+        access_token_state = TokenState.from_token(cached_tokens[0], self.refresh_policy, self.clock)
+        if access_token_state.needs_refresh(self.clock.monotonic()):
+            return False
+        self.__refresh_token_state = TokenState.from_token(cached_tokens[1], self.refresh_policy, self.clock)
+        self.__access_token_state = access_token_state
+        return True
+
+    def __store_tokens(self, access_token: Optional[str], refresh_token: Optional[str] = None) -> None:
+        # The access token is published last, so whoever sees it also sees its refresh token
+        if refresh_token is not None:
+            self.__refresh_token_state = TokenState.from_token(refresh_token, self.refresh_policy, self.clock)
+        self.__access_token_state = TokenState.from_token(access_token, self.refresh_policy, self.clock)
+
+    def __create_initial_token(self) -> Dict[str, str]:
+        # Every attempt gets a fresh assertion, the endpoint may reject a replayed one
+        self.initial_token = self.assertion_signer.take(self.service_account_key)
+        return {
+            "grant_type": JWT_BEARER_GRANT_TYPE,
+            "assertion": self.initial_token,
+        }
+
+    def __fetch_token_from_endpoint(self) -> None:
+        response_json = self.__request_token(self.__create_initial_token, "Initial token fetch failed")
+        if response_json is not None:
+            self.__store_tokens(response_json["access_token"], response_json["refresh_token"])
+
+    def __refresh_token(self):
+        if self.__refresh_token_state.needs_refresh(self.clock.monotonic()):
+            self.__fetch_token_from_endpoint()
+            return
+
+        body = {
+            "grant_type": "refresh_token",
+            "refresh_token": self.refresh_token,
+        }
+
+        response_json = self.__request_token(lambda: body, "Token refresh failed")
+        if response_json is not None:
+            self.__store_tokens(response_json.get("access_token"))
+            logger.debug("Token successfully refreshed")
+
+    def __request_token(
+        self, create_body: Callable[[], Dict[str, str]], failure_message: str
+    ) -> Optional[Dict[str, Any]]:
+        """Post to the token endpoint, retrying as the RetryPolicy allows.
+
+        :return: The response, or None if all attempts failed
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            body = create_body()
+            start = time.perf_counter()
+            try:
+                status_code, response_json = self.__post_token_request(body)
+            except requests.RequestException as e:
+                status_code = e.response.status_code if e.response is not None else None
+                self.instrumentation.token_requested(body["grant_type"], time.perf_counter() - start, status_code, e)
+                delay = self.retry_policy.delay(attempt, e)
+                if delay is None:
+                    logger.warning("%s: %s", failure_message, e)
+                    self.last_error = e
+                    return None
+                logger.info("%s, retrying in %.1f s: %s", failure_message, delay, e)
+                self.clock.sleep(delay)
+                continue
+            self.instrumentation.token_requested(body["grant_type"], time.perf_counter() - start, status_code, None)
+            return response_json
+
+    def __post_token_request(self, body: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        if not self.circuit_breaker.allow():
+            raise CircuitOpenError(f"Requests to {self.token_endpoint} are paused after repeated failures")
+        try:
+            response = self.http_session.post(self.token_endpoint, data=body, timeout=self.timeout)
+            response.raise_for_status()
+            response_json = response.json()
+        except requests.RequestException as e:
+            # Only failures that suggest an outage count, a rejected request shows that the endpoint is up
+            if self.retry_policy.is_retryable(e):
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+            raise
+        except BaseException:
+            # An http session raising something else must not leave a trial request of the circuit breaker running
+            self.circuit_breaker.record_aborted()
+            raise
+        self.circuit_breaker.record_success()
+        return response.status_code, response_json
+
+
+class TokenRegistry:
+    """Hands out one shared TokenProvider per key id, token endpoint and provider options.
+
+    Callers passing different options, like another http session or token cache,
+    get a provider of their own, so their options are never silently dropped.
+    Providers are reference counted and closed once the last user released them.
+    Acquiring a provider does not fetch a token yet, see TokenProvider.start.
+    All providers of a token endpoint share one CircuitBreaker.
+
+    release() may be called from a finalizer during garbage collection, even on a
+    thread inside acquire(). It never waits for the registry lock: a provider
+    released while the lock is held is handled by the lock holder on its way out.
+    """
+
+    def __init__(self, scheduler: Optional[RefreshScheduler] = None, clock: Clock = SYSTEM_CLOCK):
+        self.scheduler = scheduler
+        self.clock = clock
+        self.__lock = threading.Lock()
+        self.__providers: Dict[Tuple[Hashable, ...], TokenProvider] = {}
+        self.__references: Dict[Tuple[Hashable, ...], int] = {}
+        self.__keys: Dict[TokenProvider, Tuple[Hashable, ...]] = {}
+        self.__circuit_breakers: Dict[str, CircuitBreaker] = {}
+        self.__released: Deque[TokenProvider] = collections.deque()
+        register_after_fork(self)
+
+    def acquire(
+        self,
+        service_account_key: AnyServiceAccountKey,
+        token_endpoint: str,
+        http_session: requests.Session,
+        refresh_policy: Optional[RefreshPolicy] = None,
+        token_cache: Optional[FileTokenCache] = None,
+        instrumentation: Optional[TokenInstrumentation] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        assertion_signer: Optional[AssertionSigner] = None,
+    ) -> TokenProvider:
+        key = (
+            service_account_key.credentials.key_id,
+            token_endpoint,
+            http_session,
+            refresh_policy,
+            token_cache,
+            instrumentation,
+            retry_policy,
+            assertion_signer,
+        )
+        with self.__lock:
+            provider = self.__providers.get(key)
+            if provider is None:
+                provider = TokenProvider(
+                    service_account_key,
+                    token_endpoint,
+                    http_session,
+                    self.scheduler,
+                    refresh_policy,
+                    self.clock,
+                    token_cache=token_cache,
+                    instrumentation=instrumentation,
+                    retry_policy=retry_policy,
+                    circuit_breaker=self.__circuit_breaker(token_endpoint),
+                    assertion_signer=assertion_signer,
+                )
+                self.__providers[key] = provider
+                self.__references[key] = 0
+                self.__keys[provider] = key
+            self.__references[key] += 1
+        self.__release_queued()
+        return provider
+
+    def circuit_breaker(self, token_endpoint: str) -> CircuitBreaker:
+        """The CircuitBreaker shared by all token requests to token_endpoint."""
+        with self.__lock:
+            circuit_breaker = self.__circuit_breaker(token_endpoint)
+        self.__release_queued()
+        return circuit_breaker
+
+    def release(self, provider: TokenProvider) -> None:
+        self.__released.append(provider)
+        self.__release_queued()
+
+    def after_fork(self) -> None:
+        """Called in a forked child process, see register_after_fork."""
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self.__lock:
+            count = len(self.__providers)
+        self.__release_queued()
+        return count
+
+    def __release_queued(self) -> None:
+        # Every lock holder calls this after letting go of the lock, so nothing queued while it held the lock is left
+        while self.__released and self.__lock.acquire(blocking=False):
+            unused = []
+            try:
+                while self.__released:
+                    provider = self.__released.popleft()
+                    key = self.__keys.get(provider)
+                    if key is None:
+                        continue
+                    self.__references[key] -= 1
+                    if self.__references[key] > 0:
+                        continue
+                    del self.__providers[key]
+                    del self.__references[key]
+                    del self.__keys[provider]
+                    unused.append(provider)
+            finally:
+                self.__lock.release()
+            for provider in unused:
+                provider.close()
+
+    def __circuit_breaker(self, token_endpoint: str) -> CircuitBreaker:
+        circuit_breaker = self.__circuit_breakers.get(token_endpoint)
+        if circuit_breaker is None:
+            circuit_breaker = self.__circuit_breakers[token_endpoint] = CircuitBreaker(clock=self.clock)
+        return circuit_breaker
+
+
+_default_registry = TokenRegistry()
+
+
+def get_default_token_registry() -> TokenRegistry:
+    return _default_registry
@@ -0,0 +1,147 @@
+import email.utils
+import math
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import FrozenSet, Optional
+
+import requests
+
+from stackit.core.auth_methods.token_state import SYSTEM_CLOCK, Clock
+from stackit.core.fork import register_after_fork
+
+
+class CircuitOpenError(requests.RequestException):
+    """Token requests are paused because the token endpoint keeps failing, see CircuitBreaker."""
+
+
+class RetryPolicy:
+    """Decides whether and when a failed token request is tried again.
+
+    Timeouts, connection errors and the retry_status_codes are retried until
+    max_attempts requests were made. Between attempts the policy waits an
+    exponentially growing backoff with full jitter, or as long as a Retry-After
+    header asks for. Waits longer than max_backoff end the retries instead.
+    """
+
+    DEFAULT_MAX_ATTEMPTS = 3
+    DEFAULT_BACKOFF = timedelta(milliseconds=500)
+    DEFAULT_MAX_BACKOFF = timedelta(seconds=10)
+    DEFAULT_RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(
+        self,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        backoff: timedelta = DEFAULT_BACKOFF,
+        max_backoff: timedelta = DEFAULT_MAX_BACKOFF,
+        retry_status_codes: FrozenSet[int] = DEFAULT_RETRY_STATUS_CODES,
+    ):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_status_codes = retry_status_codes
+
+    def is_retryable(self, error: requests.RequestException) -> bool:
+        if isinstance(error, CircuitOpenError):
+            return False
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return True
+        return error.response is not None and error.response.status_code in self.retry_status_codes
+
+    def delay(self, attempt: int, error: requests.RequestException) -> Optional[float]:
+        """:return: Seconds to wait before the next attempt after attempt failed, or None to give up"""
+        if attempt >= self.max_attempts or not self.is_retryable(error):
+            return None
+        max_backoff = self.max_backoff.total_seconds()
+        retry_after = self.__retry_after(error.response)
+        if retry_after is not None:
+            return retry_after if retry_after <= max_backoff else None
+        backoff = min(max_backoff, self.backoff.total_seconds() * 2 ** (attempt - 1))
+        return random.uniform(0, backoff)  # noqa: S311 not used for security
+
+    @staticmethod
+    def __retry_after(response: Optional[requests.Response]) -> Optional[float]:
+        value = response.headers.get("Retry-After") if response is not None else None
+        if not isinstance(value, str):
+            return None
+        if value.strip().isdigit():
+            return float(value)
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+class CircuitBreaker:
+    """Pauses requests to a token endpoint that keeps failing.
+
+    After failure_threshold consecutive failures the circuit opens and requests
+    fail right away with CircuitOpenError. After reset_timeout, stretched by a
+    random jitter so that processes do not come back in lockstep, a single trial
+    request is let through. Its outcome closes the circuit or opens it again.
+    """
+
+    DEFAULT_FAILURE_THRESHOLD = 5
+    DEFAULT_RESET_TIMEOUT = timedelta(seconds=30)
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: timedelta = DEFAULT_RESET_TIMEOUT,
+        clock: Clock = SYSTEM_CLOCK,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.__lock = threading.Lock()
+        self.__failures = 0
+        self.__open_until = -math.inf
+        self.__trial_running = False
+        register_after_fork(self)
+
+    @property
+    def is_open(self) -> bool:
+        with self.__lock:
+            return self.__failures >= self.failure_threshold
+
+    def allow(self) -> bool:
+        with self.__lock:
+            if self.__failures < self.failure_threshold:
+                return True
+            if self.__trial_running or self.clock.monotonic() < self.__open_until:
+                return False
+            self.__trial_running = True
+            return True
+
+    def after_fork(self) -> None:
+        """Called in a forked child process, see register_after_fork."""
+        self.__lock = threading.Lock()
+        # A trial request of the parent does not finish in this process
+        self.__trial_running = False
+
+    def record_success(self) -> None:
+        with self.__lock:
+            self.__failures = 0
+            self.__trial_running = False
+
+    def record_aborted(self) -> None:
+        """A request ended without telling whether the endpoint is up, for example because it was cancelled."""
+        with self.__lock:
+            self.__trial_running = False
+
+    def record_failure(self) -> None:
+        with self.__lock:
+            self.__failures += 1
+            self.__trial_running = False
+            if self.__failures >= self.failure_threshold:
+                reset_timeout = self.reset_timeout.total_seconds()
+                jitter = random.uniform(0, reset_timeout / 2)  # noqa: S311 not used for security
+                self.__open_until = self.clock.monotonic() + reset_timeout + jitter
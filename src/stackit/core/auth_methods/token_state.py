@@ -0,0 +1,124 @@
+import math
+import random
+import time
+from datetime import timedelta
+from typing import Any, Optional
+
+import jwt
+
+
+class Clock:
+    """Source of wall clock and monotonic time, replaceable in tests."""
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+SYSTEM_CLOCK = Clock()
+
+
+class RefreshPolicy:
+    """Decides when a token is refreshed ahead of its expiry.
+
+    A token is refreshed refresh_before its exp claim, or once lifetime_fraction
+    of its lifetime has passed, whichever comes first. The lead time is capped
+    at half the token lifetime, so short-lived tokens are not refreshed
+    constantly, and a random jitter spreads refreshes of many tokens.
+    """
+
+    DEFAULT_REFRESH_BEFORE = timedelta(minutes=5)
+    DEFAULT_JITTER = timedelta(seconds=30)
+
+    def __init__(
+        self,
+        refresh_before: timedelta = DEFAULT_REFRESH_BEFORE,
+        lifetime_fraction: Optional[float] = None,
+        jitter: timedelta = DEFAULT_JITTER,
+    ):
+        if lifetime_fraction is not None and not 0 < lifetime_fraction <= 1:
+            raise ValueError("lifetime_fraction must be in (0, 1]")
+        self.refresh_before = refresh_before
+        self.lifetime_fraction = lifetime_fraction
+        self.jitter = jitter
+
+    def refresh_at(self, issued_at: float, expires_at: float) -> float:
+        if not math.isfinite(expires_at):
+            return expires_at
+        lifetime = max(expires_at - issued_at, 0)
+        lead = min(self.refresh_before.total_seconds(), lifetime / 2)
+        if self.lifetime_fraction is not None:
+            lead = max(lead, lifetime * (1 - self.lifetime_fraction))
+        jitter = random.uniform(0, min(self.jitter.total_seconds(), lead / 2))  # noqa: S311 not used for security
+        return expires_at - lead + jitter
+
+
+DEFAULT_REFRESH_POLICY = RefreshPolicy()
+
+
+class TokenState:
+    """Immutable snapshot of a token together with its pre-computed expiry.
+
+    The ``iat`` and ``exp`` claims are decoded once when the snapshot is created
+    and turned into times on the monotonic clock, so checking for expiry is a
+    plain float comparison.
+    """
+
+    __slots__ = ("token", "authorization_header", "issued_at", "expires_at", "refresh_at")
+
+    token: Optional[str]
+    authorization_header: str
+    # Monotonic times of the iat and exp claims
+    issued_at: float
+    expires_at: float
+    # Monotonic time from which the token should be replaced, see RefreshPolicy
+    refresh_at: float
+
+    def __init__(self, token: Optional[str], issued_at: float, expires_at: float, refresh_at: float):
+        object.__setattr__(self, "token", token)
+        object.__setattr__(self, "authorization_header", f"Bearer {token}")
+        object.__setattr__(self, "issued_at", issued_at)
+        object.__setattr__(self, "expires_at", expires_at)
+        object.__setattr__(self, "refresh_at", refresh_at)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(expires_at={self.expires_at!r}, refresh_at={self.refresh_at!r})"
+
+    @classmethod
+    def from_token(
+        cls,
+        token: Optional[str],
+        refresh_policy: RefreshPolicy = DEFAULT_REFRESH_POLICY,
+        clock: Clock = SYSTEM_CLOCK,
+    ) -> "TokenState":
+        if token is None:
+            return cls(None, -math.inf, -math.inf, -math.inf)
+        try:
+            claims = jwt.decode(token, options={"verify_signature": False})
+        except jwt.DecodeError:
+            return cls(token, -math.inf, -math.inf, -math.inf)
+        exp = claims.get("exp")
+        if not exp:
+            return cls(token, -math.inf, math.inf, math.inf)
+        now, monotonic_now = clock.time(), clock.monotonic()
+        expires_at = monotonic_now + (exp - now)
+        iat = claims.get("iat")
+        issued_at = monotonic_now + (iat - now) if iat else monotonic_now
+        return cls(token, issued_at, expires_at, refresh_policy.refresh_at(issued_at, expires_at))
+
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        return (time.monotonic() if now is None else now) >= self.expires_at
+
+    def needs_refresh(self, now: Optional[float] = None) -> bool:
+        return (time.monotonic() if now is None else now) >= self.refresh_at
@@ -1,13 +1,24 @@
 import json
+import logging
+import os
+import threading
+import weakref
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, Optional, Tuple, Union
 
-from requests.auth import AuthBase
-
-from stackit.core.auth_methods.key_auth import KeyAuth, ServiceAccountKey
-from stackit.core.auth_methods.token_auth import TokenAuth
 from stackit.core.configuration import Configuration
+from stackit.core.file_cache import get_default_file_cache
+from stackit.core.file_watcher import FileWatch, get_default_file_watcher
+
+# The auth methods pull in requests, jwt, cryptography and pydantic, which dominate
+# the import time. They are imported once an auth method is actually selected.
+if TYPE_CHECKING:
+    from requests.auth import AuthBase
+
+    from stackit.core.auth_methods.service_account_key import ServiceAccountKey
+
+logger = logging.getLogger(__name__)
 
 
 class KeyFileIsNotValidError(Exception):
@@ -33,53 +44,295 @@ def either_this_or_that(this: Any, that: Any) -> Optional[Any]:
     return this if this else that
 
 
+DEFAULT_CREDENTIALS_FILE_PATH = ".stackit/credentials.json"
+
+
+class AuthorizationConfiguration:
+    """The settings an Authorization is created from, resolved once.
+
+    Explicit arguments take precedence over environment variables, which take
+    precedence over the credentials file. Instances are immutable and hashable,
+    so equal ones can share an Authorization, see Authorization.shared(). Objects
+    like a custom auth or http session are compared by identity.
+    """
+
+    __slots__ = (
+        "service_account_mail",
+        "service_account_token",
+        "service_account_key_path",
+        "private_key_path",
+        "token_endpoint",
+        "custom_auth",
+        "custom_http_session",
+        "lazy_token_fetch",
+        "prefetch_token",
+        "token_cache_path",
+        "instrumentation",
+        "token_retry_policy",
+        "credentials_file_path",
+        "watch_key_files",
+        "__configuration",
+        "__key",
+    )
+
+    service_account_mail: Optional[str]
+    service_account_token: Optional[str]
+    service_account_key_path: Optional[str]
+    private_key_path: Optional[str]
+    token_endpoint: Optional[str]
+    custom_auth: Optional["AuthBase"]
+    custom_http_session: Any
+    lazy_token_fetch: bool
+    prefetch_token: bool
+    token_cache_path: Optional[str]
+    instrumentation: Any
+    token_retry_policy: Any
+    credentials_file_path: str
+    watch_key_files: bool
+
+    def __init__(self, configuration: Configuration):
+        credentials = self.__read_credentials_file(configuration.credentials_file_path)
+        credentials_file_path = configuration.credentials_file_path
+        values = {
+            "service_account_mail": either_this_or_that(
+                configuration.service_account_mail, credentials.service_account_mail
+            ),
+            "service_account_token": either_this_or_that(
+                configuration.service_account_token, credentials.service_account_token
+            ),
+            "service_account_key_path": either_this_or_that(
+                configuration.service_account_key_path, credentials.service_account_key_path
+            ),
+            "private_key_path": either_this_or_that(configuration.private_key_path, credentials.private_key_path),
+            "token_endpoint": configuration.token_endpoint,
+            "custom_auth": configuration.custom_auth,
+            "custom_http_session": configuration.custom_http_session,
+            "lazy_token_fetch": configuration.lazy_token_fetch,
+            "prefetch_token": configuration.prefetch_token,
+            "token_cache_path": configuration.token_cache_path,
+            "instrumentation": configuration.instrumentation,
+            "token_retry_policy": configuration.token_retry_policy,
+            "credentials_file_path": str(
+                Path(credentials_file_path) if credentials_file_path else Path.home() / DEFAULT_CREDENTIALS_FILE_PATH
+            ),
+            "watch_key_files": configuration.watch_key_files,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "_AuthorizationConfiguration__configuration", configuration)
+        key = tuple(value if isinstance(value, (str, bool, type(None))) else id(value) for value in values.values())
+        object.__setattr__(self, "_AuthorizationConfiguration__key", key)
+
+    def reload(self) -> "AuthorizationConfiguration":
+        """Resolve the configuration again, e.g. after the credentials file changed."""
+        return AuthorizationConfiguration(self.__configuration)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, AuthorizationConfiguration):
+            return NotImplemented
+        return self.__key == other.__key
+
+    def __hash__(self) -> int:
+        return hash(self.__key)
+
+    @staticmethod
+    def __read_credentials_file(file_path: Optional[str]) -> Credentials:
+        p = Path(file_path) if file_path else Path.home() / DEFAULT_CREDENTIALS_FILE_PATH
+        if file_path and (not p.exists() or not p.is_file()):
+            raise FileNotFoundError(f"Credentials file at {file_path} does not exist")
+
+        try:
+            return get_default_file_cache().get(p, AuthorizationConfiguration.__parse_credentials_file)
+        except FileNotFoundError:
+            return Credentials()
+
+    @staticmethod
+    def __parse_credentials_file(path: str) -> Credentials:
+        with open(path, "r") as f:
+            content = f.read()
+            json_content = json.loads(content)
+            return Credentials(**json_content)
+
+
 class Authorization:
-    DEFAULT_CREDENTIALS_FILE_PATH = ".stackit/credentials.json"
+    DEFAULT_CREDENTIALS_FILE_PATH = DEFAULT_CREDENTIALS_FILE_PATH
     service_account_mail: Optional[str] = None
     service_account_token: Optional[str] = None
-    service_account_key: Optional[ServiceAccountKey] = None
+    service_account_key: Optional["ServiceAccountKey"] = None
     service_account_key_path: Optional[str] = None
     private_key: Optional[str] = None
     private_key_path: Optional[str] = None
-    auth_method: Optional[AuthBase] = None
+    auth_method: Optional["AuthBase"] = None
 
-    def __init__(self, configuration: Configuration):
-        credentials = self.__read_credentials_file(configuration.credentials_file_path)
-        self.service_account_mail = either_this_or_that(
-            configuration.service_account_mail, credentials.service_account_mail
-        )
-        self.service_account_token = either_this_or_that(
-            configuration.service_account_token, credentials.service_account_token
-        )
-        self.service_account_key_path = either_this_or_that(
-            configuration.service_account_key_path, credentials.service_account_key_path
-        )
-        self.private_key_path = either_this_or_that(configuration.private_key_path, credentials.private_key_path)
+    def __init__(self, configuration: Union[Configuration, AuthorizationConfiguration]):
+        if not isinstance(configuration, AuthorizationConfiguration):
+            configuration = AuthorizationConfiguration(configuration)
+        self.configuration = configuration
+        self.service_account_mail = configuration.service_account_mail
+        self.service_account_token = configuration.service_account_token
+        self.service_account_key_path = configuration.service_account_key_path
+        self.private_key_path = configuration.private_key_path
         self.auth_method = configuration.custom_auth
         self.token_endpoint = configuration.token_endpoint
+        self.http_session = configuration.custom_http_session
+        self.lazy_token_fetch = configuration.lazy_token_fetch
+        self.prefetch_token = configuration.prefetch_token
+        self.token_cache_path = configuration.token_cache_path
+        self.instrumentation = configuration.instrumentation
+        self.token_retry_policy = configuration.token_retry_policy
+        self.watch_key_files = configuration.watch_key_files
         self.__read_keys()
         self.auth_method = self.__get_authentication()
+        self.__file_watch: Optional[FileWatch] = None
+        self.__closed = False
+        # Number of callers shared() handed this instance to, see close()
+        self.__shared_references = 0
+        if self.watch_key_files and configuration.custom_auth is None and self.__is_key_auth_possible():
+            # Rotated keys are swapped in by __reload_keys, see KeyAuth.replace_key
+            self.__file_watch = get_default_file_watcher().watch(self.__watched_paths(), self.__reload_keys)
+
+    @classmethod
+    def shared(cls, configuration: Union[Configuration, AuthorizationConfiguration]) -> "Authorization":
+        """Return the Authorization of an equal configuration that is still in use, or create one.
+
+        Key files are only read when the Authorization is created, unless watch_key_files is set.
+        Every caller may close the returned instance once, it is only closed once all of them did.
+        """
+        if not isinstance(configuration, AuthorizationConfiguration):
+            configuration = AuthorizationConfiguration(configuration)
+        with _shared_authorizations_lock:
+            authorization = _shared_authorizations.get(configuration)
+            if authorization is not None:
+                authorization.__shared_references += 1
+                return authorization
+        # Created outside the lock, so resolving one configuration does not block the others
+        created = cls(configuration)
+        with _shared_authorizations_lock:
+            authorization = _shared_authorizations.setdefault(configuration, created)
+            authorization.__shared_references += 1
+        if authorization is not created:
+            created.close()
+        return authorization
+
+    def close(self) -> None:
+        """Stop watching key files and close the auth method, unless it is a custom one.
+
+        An instance returned by shared() is only closed once every caller it was returned to
+        closed it, until then close() only gives up the reference of the caller. A closed
+        Authorization is no longer handed out by shared().
+        """
+        with _shared_authorizations_lock:
+            if self.__shared_references > 1:
+                self.__shared_references -= 1
+                return
+            self.__shared_references = 0
+            if _shared_authorizations.get(self.configuration) is self:
+                del _shared_authorizations[self.configuration]
+        self.__closed = True
+        if self.__file_watch is not None:
+            self.__file_watch.cancel()
+        close = getattr(self.auth_method, "close", None)
+        if self.auth_method is not self.configuration.custom_auth and close is not None:
+            close()
+
+    def __enter__(self) -> "Authorization":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
     def __read_keys(self):
-        if self.service_account_key_path and self.service_account_key is None:
-            service_account_key_json = self.__read_key_file(self.service_account_key_path)
-            self.service_account_key = ServiceAccountKey.model_validate_json(service_account_key_json)
-        if self.private_key_path:
-            self.private_key = self.__read_key_file(self.private_key_path)
+        self.service_account_key, self.private_key = self.__load_keys(
+            self.service_account_key_path, self.private_key_path
+        )
+
+    def __reload_keys(self) -> None:
+        """Swap in changed key files, keeping the current key if they are not valid."""
+        from stackit.core.auth_methods.assertion import load_private_key, signing_algorithm
+        from stackit.core.auth_methods.key_auth import TokenUnavailableError
+
+        if self.__closed:
+            return
+        try:
+            configuration = self.configuration.reload()
+            service_account_key, private_key = self.__load_keys(
+                configuration.service_account_key_path, configuration.private_key_path
+            )
+            if service_account_key is None or service_account_key.credentials.private_key is None:
+                raise KeyFileIsNotValidError("No service account key with a private key is configured")
+            signing_algorithm(load_private_key(service_account_key.credentials.private_key))
+        except Exception:
+            logger.warning(
+                "Keeping the current service account key, the changed key files are not valid", exc_info=True
+            )
+            return
+        if service_account_key != self.service_account_key:
+            try:
+                self.auth_method.replace_key(service_account_key)
+            except TokenUnavailableError:
+                logger.warning("Keeping the current service account key, no token could be fetched with the new one")
+                return
+            self.service_account_key = service_account_key
+            logger.info("Service account key %s loaded", service_account_key.credentials.key_id)
+        self.private_key = private_key
+        self.service_account_key_path = configuration.service_account_key_path
+        self.private_key_path = configuration.private_key_path
+        paths = self.__watched_paths()
+        if paths != self.__file_watch.paths:
+            self.__file_watch.cancel()
+            self.__file_watch = get_default_file_watcher().watch(paths, self.__reload_keys)
+
+    def __watched_paths(self) -> Tuple[str, ...]:
+        paths = (self.configuration.credentials_file_path, self.service_account_key_path, self.private_key_path)
+        return tuple(str(path) for path in paths if path)
+
+    @staticmethod
+    def __load_keys(
+        service_account_key_path: Optional[str], private_key_path: Optional[str]
+    ) -> Tuple[Optional["ServiceAccountKey"], Optional[str]]:
+        file_cache = get_default_file_cache()
+        service_account_key = private_key = None
+        if service_account_key_path:
+            service_account_key = file_cache.get(service_account_key_path, Authorization.__read_service_account_key)
+        if private_key_path:
+            private_key = file_cache.get(private_key_path, Authorization.__read_key_file)
         # Integrate any private key into the service account key
         if (
-            self.service_account_key is not None
-            and self.service_account_key.credentials.private_key is None
-            and self.private_key is not None
+            service_account_key is not None
+            and service_account_key.credentials.private_key is None
+            and private_key is not None
         ):
-            self.service_account_key.credentials.private_key = self.private_key
+            # The cached key is shared with other instances, so it is copied instead of modified
+            credentials = service_account_key.credentials.model_copy(update={"private_key": private_key})
+            service_account_key = service_account_key.model_copy(update={"credentials": credentials})
+        return service_account_key, private_key
 
-    def __get_authentication(self) -> Optional[AuthBase]:
+    def __get_authentication(self) -> Optional["AuthBase"]:
         if self.auth_method:
             return self.auth_method
         elif self.__is_key_auth_possible():
-            return KeyAuth(self.service_account_key, self.token_endpoint)
+            from stackit.core.auth_methods.key_auth import KeyAuth
+            from stackit.core.auth_methods.token_cache import FileTokenCache
+
+            return KeyAuth(
+                self.service_account_key,
+                self.token_endpoint,
+                self.http_session,
+                lazy=self.lazy_token_fetch,
+                prefetch=self.prefetch_token,
+                token_cache=FileTokenCache(self.token_cache_path) if self.token_cache_path else None,
+                instrumentation=self.instrumentation,
+                retry_policy=self.token_retry_policy,
+            )
         elif self.service_account_token:
+            from stackit.core.auth_methods.token_auth import TokenAuth
+
             return TokenAuth(self.service_account_token)
         else:
             return None
@@ -91,22 +344,31 @@ class Authorization:
             return True
         return False
 
-    def __read_credentials_file(self, file_path: Optional[str]) -> Credentials:
-        p = Path(file_path) if file_path else Path.home() / self.DEFAULT_CREDENTIALS_FILE_PATH
-        if file_path and (not p.exists() or not p.is_file()):
-            raise FileNotFoundError(f"Credentials file at {file_path} does not exist")
+    @staticmethod
+    def __read_service_account_key(path: str) -> "ServiceAccountKey":
+        from stackit.core.auth_methods.service_account_key import ServiceAccountKey
 
-        try:
-            with open(p, "r") as f:
-                content = f.read()
-                json_content = json.loads(content)
-                return Credentials(**json_content)
-        except FileNotFoundError:
-            return Credentials()
+        return ServiceAccountKey.model_validate_json(Authorization.__read_key_file(path))
 
-    def __read_key_file(self, path: str) -> str:
+    @staticmethod
+    def __read_key_file(path: str) -> str:
         with open(path, "r") as f:
             key = f.read()
             if len(key) == 0:
                 raise KeyFileIsNotValidError(f"Key file is empty: {path}")
             return key
+
+
+_shared_authorizations: "weakref.WeakValueDictionary[AuthorizationConfiguration, Authorization]" = (
+    weakref.WeakValueDictionary()
+)
+_shared_authorizations_lock = threading.Lock()
+
+
+def _after_fork_in_child() -> None:
+    global _shared_authorizations_lock
+    _shared_authorizations_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):  # Not available on Windows
+    os.register_at_fork(after_in_child=_after_fork_in_child)
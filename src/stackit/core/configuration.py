@@ -9,6 +9,7 @@ class EnvironmentVariables:
     TOKEN_BASEURL_ENV = "STACKIT_TOKEN_BASEURL"  # noqa: S105 false positive
     CREDENTIALS_PATH_ENV = "STACKIT_CREDENTIALS_PATH"
     REGION_ENV = "STACKIT_REGION"
+    TOKEN_CACHE_PATH_ENV = "STACKIT_TOKEN_CACHE_PATH"  # noqa: S105 false positive
 
     def __init__(self):
         self.account_email = os.environ.get(self.SERVICE_ACCOUNT_EMAIL_ENV)
@@ -18,6 +19,7 @@ class EnvironmentVariables:
         self.token_baseurl = os.environ.get(self.TOKEN_BASEURL_ENV)
         self.credentials_path = os.environ.get(self.CREDENTIALS_PATH_ENV)
         self.region = os.environ.get(self.REGION_ENV)
+        self.token_cache_path = os.environ.get(self.TOKEN_CACHE_PATH_ENV)
 
 
 class Configuration:
@@ -35,6 +37,12 @@ class Configuration:
         custom_http_session=None,
         custom_auth=None,
         server_index=None,
+        lazy_token_fetch=False,
+        prefetch_token=False,
+        token_cache_path=None,
+        instrumentation=None,
+        token_retry_policy=None,
+        watch_key_files=False,
     ) -> None:
         environment_variables = EnvironmentVariables()
         self.region = region if region else environment_variables.region
@@ -58,3 +66,9 @@ class Configuration:
         self.custom_http_session = custom_http_session
         self.custom_auth = custom_auth
         self.server_index = server_index if server_index else 0
+        self.lazy_token_fetch = lazy_token_fetch
+        self.prefetch_token = prefetch_token
+        self.token_cache_path = environment_variables.token_cache_path if token_cache_path is None else token_cache_path
+        self.instrumentation = instrumentation
+        self.token_retry_policy = token_retry_policy
+        self.watch_key_files = watch_key_files
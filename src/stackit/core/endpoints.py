@@ -0,0 +1,151 @@
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+import requests
+
+from stackit.core.configuration import Configuration
+from stackit.core.fork import register_after_fork
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WARM_UP_TIMEOUT = 5.0
+MAX_WARM_UP_WORKERS = 32
+
+
+class EndpointResolver:
+    """Resolves the base URLs of services, memoized per (service, region, server index).
+
+    Services are registered with the server objects of their OpenAPI definition:
+    a url template and variables with a default_value and optional enum_values.
+    The region fills the region variable, the others keep their default. A
+    custom endpoint takes precedence over all servers.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__servers: Dict[str, Tuple[Mapping[str, Any], ...]] = {}
+        self.__urls: Dict[Tuple[str, Optional[str], int], str] = {}
+        register_after_fork(self)
+
+    def register(self, service: str, servers: Sequence[Mapping[str, Any]]) -> None:
+        """Set the servers of a service, replacing any registered before."""
+        with self.__lock:
+            self.__servers[service] = tuple(servers)
+            for key in [key for key in self.__urls if key[0] == service]:
+                del self.__urls[key]
+
+    def resolve(
+        self,
+        service: str,
+        region: Optional[str] = None,
+        server_index: int = 0,
+        custom_endpoint: Optional[str] = None,
+    ) -> str:
+        """
+        :raises KeyError: The service was not registered
+        :raises ValueError: There is no server with this index, or it does not serve the region
+        """
+        if custom_endpoint:
+            return custom_endpoint
+        key = (service, region, server_index)
+        url = self.__urls.get(key)
+        if url is not None:
+            return url
+        with self.__lock:
+            servers = self.__servers[service]
+        url = self.__expand(servers, region, server_index)
+        with self.__lock:
+            # Unless the service was registered again in the meantime
+            if self.__servers.get(service) is servers:
+                self.__urls[key] = url
+        return url
+
+    def resolve_configuration(self, service: str, configuration: Configuration) -> str:
+        return self.resolve(service, configuration.region, configuration.server_index, configuration.custom_endpoint)
+
+    def warm_up(
+        self,
+        services: Iterable[str],
+        configuration: Configuration,
+        connections: int = 1,
+        timeout: float = DEFAULT_WARM_UP_TIMEOUT,
+    ) -> Dict[str, Optional[Exception]]:
+        """Open connections to the endpoints of services through the session of configuration, see warm_up().
+
+        :raises ValueError: configuration has no custom_http_session, so its clients would not reuse the connections
+        """
+        if configuration.custom_http_session is None:
+            raise ValueError("Warming up needs the custom_http_session that the service clients send requests through")
+        urls = [self.resolve_configuration(service, configuration) for service in services]
+        return warm_up(urls, configuration.custom_http_session, connections, timeout)
+
+    def after_fork(self) -> None:
+        """Called in a forked child process, see register_after_fork."""
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__servers)
+
+    @staticmethod
+    def __expand(servers: Sequence[Mapping[str, Any]], region: Optional[str], server_index: int) -> str:
+        if not 0 <= server_index < len(servers):
+            raise ValueError(f"Invalid server index {server_index}, must be less than {len(servers)}")
+        server = servers[server_index]
+        url = server["url"]
+        for name, variable in server.get("variables", {}).items():
+            value = region if name == "region" and region else variable["default_value"]
+            if "enum_values" in variable and value not in variable["enum_values"]:
+                raise ValueError(f"Invalid {name} {value!r} for {url}, must be one of {variable['enum_values']}")
+            url = url.replace(f"{{{name}}}", value)
+        return url
+
+
+def warm_up(
+    urls: Iterable[str],
+    session: requests.Session,
+    connections: int = 1,
+    timeout: float = DEFAULT_WARM_UP_TIMEOUT,
+) -> Dict[str, Optional[Exception]]:
+    """Open pooled connections to the hosts of urls in parallel, so first requests skip DNS, TCP and TLS setup.
+
+    Each url gets connections concurrent HEAD requests, whatever they answer. The
+    connections stay open in the pool of session, whose pool_maxsize bounds how
+    many are kept per host. Only requests sent through the same session reuse
+    them, so pass the session given to the service clients as custom_http_session.
+
+    :return: Per url, the error if its host could not be reached, otherwise None
+    """
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+    targets = [url for url in urls for _ in range(connections)]
+    errors: Dict[str, Optional[Exception]] = dict.fromkeys(urls)
+    open_connection = functools.partial(_open_connection, session, timeout)
+    with ThreadPoolExecutor(min(len(targets), MAX_WARM_UP_WORKERS), thread_name_prefix="stackit-warm-up") as executor:
+        results = list(executor.map(open_connection, targets))
+    for url, error in zip(targets, results):
+        if error is not None:
+            logger.warning("Warming up the connection to %s failed: %s", url, error)
+            errors[url] = error
+    return errors
+
+
+def _open_connection(session: requests.Session, timeout: float, url: str) -> Optional[Exception]:
+    try:
+        response = session.head(url, timeout=timeout, allow_redirects=False)
+    except requests.RequestException as e:
+        return e
+    # Hands the connection back to the pool
+    response.close()
+    return None
+
+
+_default_resolver = EndpointResolver()
+
+
+def get_default_endpoint_resolver() -> EndpointResolver:
+    return _default_resolver
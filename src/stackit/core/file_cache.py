@@ -0,0 +1,64 @@
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Hashable, Tuple, TypeVar, Union
+
+from stackit.core.fork import register_after_fork
+
+T = TypeVar("T")
+
+
+class FileCache:
+    """Memoizes what a loader parsed from a file until the file changes.
+
+    Entries are keyed by the loader, the path and the file's device, inode,
+    modification time and size, so replacing or editing a file invalidates
+    its entry. Files that cannot be stat'ed are loaded without caching.
+    Cached values are shared, callers must not modify them.
+    """
+
+    DEFAULT_MAX_SIZE = 256
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.__lock = threading.Lock()
+        self.__entries: "OrderedDict[Tuple[Hashable, ...], Any]" = OrderedDict()
+        register_after_fork(self)
+
+    def get(self, path: Union[str, Path], loader: Callable[[str], T]) -> T:
+        path = str(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return loader(path)
+        key = (loader, path, stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                return self.__entries[key]
+        value = loader(path)
+        with self.__lock:
+            self.__entries[key] = value
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+    def after_fork(self) -> None:
+        """Called in a forked child process, see register_after_fork."""
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__entries)
+
+
+_default_file_cache = FileCache()
+
+
+def get_default_file_cache() -> FileCache:
+    return _default_file_cache
@@ -0,0 +1,135 @@
+import inspect
+import logging
+import os
+import threading
+import weakref
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, Hashable, Iterable, List, Optional, Tuple, Union
+
+from stackit.core.fork import register_after_fork
+
+logger = logging.getLogger(__name__)
+
+
+class FileWatch:
+    """A registration of a callback for changes of some files, see FileWatcher.watch."""
+
+    paths: Tuple[str, ...]
+
+    def __init__(self, watcher: "FileWatcher", paths: Iterable[Union[str, Path]], callback: Callable[[], None]):
+        self.paths = tuple(str(path) for path in paths)
+        # Bound methods are held weakly, so watching does not keep their object alive
+        self.__callback = weakref.WeakMethod(callback) if inspect.ismethod(callback) else lambda: callback
+        self.__watcher = watcher
+        self.__signatures = self.__stat()
+
+    def cancel(self) -> None:
+        self.__watcher.unwatch(self)
+
+    @property
+    def callback(self) -> Optional[Callable[[], None]]:
+        """The callback, or None once the object of a bound method was garbage collected."""
+        return self.__callback()
+
+    def changed(self) -> bool:
+        """Whether any of the files changed since the last call."""
+        signatures = self.__stat()
+        changed, self.__signatures = signatures != self.__signatures, signatures
+        return changed
+
+    def __stat(self) -> Tuple[Hashable, ...]:
+        signatures = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                signatures.append(None)
+                continue
+            signatures.append((stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        return tuple(signatures)
+
+
+class FileWatcher:
+    """Calls back when watched files change, by polling their stat from a single thread.
+
+    A file counts as changed when its device, inode, modification time or size
+    differ, or when it appears or disappears. Paths are followed through symlinks,
+    so files replaced by swapping a symlinked directory, as Kubernetes does for
+    mounted secrets, are detected as well. Callbacks run on the watcher thread.
+    """
+
+    DEFAULT_INTERVAL = timedelta(seconds=5)
+
+    def __init__(self, interval: timedelta = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.__condition = threading.Condition()
+        self.__watches: List[FileWatch] = []
+        self.__thread: Optional[threading.Thread] = None
+        register_after_fork(self)
+
+    def watch(self, paths: Iterable[Union[str, Path]], callback: Callable[[], None]) -> FileWatch:
+        """Call callback whenever any of the files changes, until the returned watch is cancelled."""
+        watch = FileWatch(self, paths, callback)
+        with self.__condition:
+            self.__watches.append(watch)
+            if self.__thread is None:
+                self.__start()
+        return watch
+
+    def unwatch(self, watch: FileWatch) -> None:
+        with self.__condition:
+            if watch in self.__watches:
+                self.__watches.remove(watch)
+
+    def check(self) -> None:
+        """Check all watched files once and call back for the changed ones."""
+        with self.__condition:
+            watches = list(self.__watches)
+        for watch in watches:
+            callback = watch.callback
+            if callback is None:
+                self.unwatch(watch)
+            elif watch.changed():
+                try:
+                    callback()
+                except Exception:
+                    logger.exception("Handling changes of %s failed", ", ".join(watch.paths))
+
+    def close(self) -> None:
+        """Stop the watcher thread and drop all watches. Watching again starts a new thread."""
+        with self.__condition:
+            self.__watches.clear()
+            self.__thread = None
+            self.__condition.notify_all()
+
+    def after_fork(self) -> None:
+        """Called in a forked child process, see register_after_fork. The watches are kept."""
+        self.__condition = threading.Condition()
+        self.__thread = None
+        if self.__watches:
+            self.__start()
+
+    def __len__(self) -> int:
+        with self.__condition:
+            return len(self.__watches)
+
+    def __start(self) -> None:
+        self.__thread = threading.Thread(target=self.__run, name="stackit-file-watcher", daemon=True)
+        self.__thread.start()
+
+    def __run(self) -> None:
+        while True:
+            with self.__condition:
+                self.__condition.wait(self.interval.total_seconds())
+                # close() detaches the thread from the watcher
+                if self.__thread is not threading.current_thread():
+                    return
+            self.check()
+
+
+_default_file_watcher = FileWatcher()
+
+
+def get_default_file_watcher() -> FileWatcher:
+    return _default_file_watcher
@@ -0,0 +1,29 @@
+import itertools
+import os
+import weakref
+from typing import Any
+
+# By registration order, see _after_fork_in_child
+_instances: "weakref.WeakValueDictionary[int, Any]" = weakref.WeakValueDictionary()
+_sequence = itertools.count()
+
+
+def register_after_fork(instance: Any) -> None:
+    """Call instance.after_fork() in child processes forked while instance is alive.
+
+    Threads of the parent do not exist in a forked child, but locks they held at
+    the time of the fork stay held, and executors still count their threads. So
+    instances owning locks, threads or executors replace them in after_fork().
+    Instances are called in the order they registered, so after_fork() may use the
+    instances that existed when instance was created, like its RefreshScheduler.
+    """
+    _instances[next(_sequence)] = instance
+
+
+def _after_fork_in_child() -> None:
+    for _, instance in sorted(_instances.items()):
+        instance.after_fork()
+
+
+if hasattr(os, "register_at_fork"):  # Not available on Windows
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,49 @@
+import os
+import threading
+from typing import Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+# Only connection errors are retried: a token request that reached the server must not be replayed blindly
+DEFAULT_MAX_RETRIES = Retry(total=3, connect=3, read=0, status=0, other=0, backoff_factor=0.1)
+
+_default_session: Optional[requests.Session] = None
+_default_session_lock = threading.Lock()
+
+
+def create_session(
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+    max_retries: Union[int, Retry] = DEFAULT_MAX_RETRIES,
+) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=max_retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_default_session() -> requests.Session:
+    """Return the keep-alive session shared by all token requests of this process."""
+    global _default_session
+    if _default_session is None:
+        with _default_session_lock:
+            if _default_session is None:
+                _default_session = create_session()
+    return _default_session
+
+
+def _after_fork_in_child() -> None:
+    global _default_session_lock
+    _default_session_lock = threading.Lock()
+    if _default_session is not None:
+        # Connections of the parent must not be shared with it, the session opens new ones on next use
+        _default_session.close()
+
+
+if hasattr(os, "register_at_fork"):  # Not available on Windows
+    os.register_at_fork(after_in_child=_after_fork_in_child)
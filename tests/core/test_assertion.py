@@ -0,0 +1,148 @@
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from unittest.mock import Mock
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import dsa, ec, ed25519, rsa
+
+from stackit.core.auth_methods.assertion import (
+    ASSERTION_VALIDITY,
+    AssertionSigner,
+    create_assertion,
+    load_private_key,
+    signing_algorithm,
+)
+from stackit.core.auth_methods.refresh_scheduler import RefreshScheduler
+from stackit.core.auth_methods.token_provider import TokenProvider
+from stackit.core.auth_methods.token_state import RefreshPolicy
+from tests.core.conftest import REFRESH_BEFORE, TOKEN_LIFETIME
+
+
+class CountingExecutor(Executor):
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted += 1
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def decode(assertion, service_account_key):
+    public_key = load_private_key(service_account_key.credentials.private_key).public_key()
+    return jwt.decode(assertion, public_key, algorithms=["RS512"], audience=service_account_key.credentials.audience)
+
+
+class TestAssertionSigner:
+    def test_prepared_assertion_is_handed_out_once(self, service_account_key):
+        executor = CountingExecutor()
+        signer = AssertionSigner(executor)
+        signer.prepare(service_account_key)
+        signer.prepare(service_account_key)
+        assert executor.submitted == 1
+
+        first = signer.take(service_account_key)
+        second = signer.take(service_account_key)
+        assert executor.submitted == 1
+        assert decode(first, service_account_key)["jti"] != decode(second, service_account_key)["jti"]
+
+    def test_assertion_close_to_expiry_is_not_handed_out(self, service_account_key, fake_clock):
+        executor = CountingExecutor()
+        signer = AssertionSigner(executor, fake_clock)
+        signer.prepare(service_account_key)
+        fake_clock.advance((ASSERTION_VALIDITY - AssertionSigner.MIN_VALIDITY).total_seconds())
+        signer.take(service_account_key)
+        assert len(signer) == 0
+
+        signer.prepare(service_account_key)
+        fake_clock.advance(ASSERTION_VALIDITY.total_seconds())
+        signer.prepare_many([])
+        assert len(signer) == 0
+
+    def test_batches_are_signed_in_other_processes(self, service_account_key):
+        keys = [
+            service_account_key.model_copy(
+                update={"credentials": service_account_key.credentials.model_copy(update={"key_id": f"key-{i}"})}
+            )
+            for i in range(3)
+        ]
+        with ProcessPoolExecutor(2) as executor:
+            signer = AssertionSigner(executor)
+            signer.prepare_many(keys)
+            assertions = [signer.take(key) for key in keys]
+        for key, assertion in zip(keys, assertions):
+            assert jwt.get_unverified_header(assertion)["kid"] == key.credentials.key_id
+            assert decode(assertion, key)["iss"] == key.credentials.issuer
+
+
+class TestTokenProviderPresigning:
+    def test_assertion_is_signed_ahead_of_refresh_that_needs_it(self, service_account_key, token_endpoint, fake_clock):
+        scheduler = Mock(spec=RefreshScheduler)
+        executor = ThreadPoolExecutor(1)
+        scheduler.submit.side_effect = executor.submit
+        signer = Mock(spec=AssertionSigner)
+        signer.take.return_value = "assertion"
+        provider = TokenProvider(
+            service_account_key,
+            "https://service-account.api.stackit.cloud/token",
+            token_endpoint,
+            scheduler,
+            RefreshPolicy(refresh_before=timedelta(seconds=REFRESH_BEFORE), jitter=timedelta(0)),
+            fake_clock,
+            assertion_signer=signer,
+        )
+        provider.start()
+        signer.take.assert_called_once()
+
+        # The refresh token outlives two access tokens, so the third refresh needs a new assertion
+        refresh_interval = TOKEN_LIFETIME - REFRESH_BEFORE
+        for _ in range(2):
+            fake_clock.advance(refresh_interval)
+            provider.refresh_due()
+            provider.refresh_future.result(timeout=5)
+        presign_at = scheduler.schedule.call_args.args[1]
+        assert presign_at == fake_clock.monotonic() + refresh_interval - TokenProvider.PRESIGN_LEAD.total_seconds()
+        signer.prepare.assert_not_called()
+
+        fake_clock.advance(refresh_interval - TokenProvider.PRESIGN_LEAD.total_seconds())
+        provider.refresh_due()
+        signer.prepare.assert_called_once_with(service_account_key)
+        assert scheduler.schedule.call_args.args[1] == presign_at + TokenProvider.PRESIGN_LEAD.total_seconds()
+        assert signer.take.call_count == 1
+
+        fake_clock.advance(TokenProvider.PRESIGN_LEAD.total_seconds())
+        provider.refresh_due()
+        provider.refresh_future.result(timeout=5)
+        assert signer.take.call_count == 2
+        assert token_endpoint.requests[-1]["grant_type"] == "urn:ietf:params:oauth:grant-type:jwt-bearer"
+        executor.shutdown()
+
+
+@pytest.mark.parametrize(
+    "generate_private_key, algorithm",
+    [
+        (lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048), "RS512"),
+        (lambda: ec.generate_private_key(ec.SECP256R1()), "ES256"),
+        (lambda: ec.generate_private_key(ec.SECP384R1()), "ES384"),
+        (ed25519.Ed25519PrivateKey.generate, "EdDSA"),
+    ],
+)
+def test_signing_algorithm_is_derived_from_private_key(service_account_key, generate_private_key, algorithm):
+    private_key = generate_private_key()
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    credentials = service_account_key.credentials.model_copy(update={"private_key": private_pem})
+    assertion = create_assertion(service_account_key.model_copy(update={"credentials": credentials}))
+
+    assert jwt.get_unverified_header(assertion)["alg"] == algorithm
+    claims = jwt.decode(assertion, private_key.public_key(), algorithms=[algorithm], audience=credentials.audience)
+    assert claims["sub"] == credentials.subject
+
+
+def test_unsupported_private_key_is_rejected():
+    with pytest.raises(ValueError, match="DSAPrivateKey"):
+        signing_algorithm(dsa.generate_private_key(key_size=2048))
@@ -0,0 +1,202 @@
+import asyncio
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+import jwt
+import pytest
+
+from stackit.core.auth_methods import async_key_auth
+from stackit.core.auth_methods.assertion import AssertionSigner
+from stackit.core.auth_methods.async_key_auth import AsyncKeyAuth
+from stackit.core.auth_methods.async_token_auth import AsyncTokenAuth
+from stackit.core.auth_methods.token_provider import TokenUnavailableError
+from stackit.core.auth_methods.token_retry import CircuitBreaker, RetryPolicy
+
+
+@pytest.fixture
+def httpx():
+    return pytest.importorskip("httpx")
+
+
+@pytest.fixture
+def access_token():
+    now = int(time.time())
+    return jwt.encode({"iat": now, "exp": now + 3600}, "not-a-real-secret-only-used-for-testing", algorithm="HS256")
+
+
+@pytest.fixture
+def token_endpoint(httpx, access_token):
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"access_token": access_token, "refresh_token": access_token})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client.requests = requests
+    return client
+
+
+@pytest.fixture
+def failing_token_endpoint(httpx, access_token):
+    """Answers with 503 to the first client.failures requests, to all of them by default"""
+
+    def handler(request):
+        client.requests.append(request)
+        if len(client.requests) <= client.failures:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"access_token": access_token, "refresh_token": access_token})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client.requests = []
+    client.failures = float("inf")
+    return client
+
+
+class TestAsyncAuth:
+    def test_token_auth_sets_header(self):
+        async def main():
+            auth = AsyncTokenAuth("token")
+            assert await auth.get_authorization_header() == "Bearer token"
+
+        asyncio.run(main())
+
+    def test_key_auth_fetches_token_on_first_use(self, service_account_key, token_endpoint, access_token):
+        async def main():
+            auth = AsyncKeyAuth(service_account_key, http_client=token_endpoint)
+            assert token_endpoint.requests == []
+            assert await auth.get_authorization_header() == f"Bearer {access_token}"
+            assert len(token_endpoint.requests) == 1
+
+        asyncio.run(main())
+
+    def test_concurrent_first_uses_share_one_token_fetch(self, service_account_key, token_endpoint, access_token):
+        async def main():
+            auth = AsyncKeyAuth(service_account_key, http_client=token_endpoint)
+            headers = await asyncio.gather(*(auth.get_authorization_header() for _ in range(16)))
+            assert set(headers) == {f"Bearer {access_token}"}
+            assert len(token_endpoint.requests) == 1
+
+        asyncio.run(main())
+
+    def test_assertion_is_signed_off_the_event_loop(self, service_account_key, token_endpoint):
+        signing_threads = []
+
+        class RecordingSigner(AssertionSigner):
+            def take(self, service_account_key):
+                signing_threads.append(threading.current_thread())
+                return super().take(service_account_key)
+
+        async def main():
+            auth = AsyncKeyAuth(service_account_key, http_client=token_endpoint, assertion_signer=RecordingSigner())
+            await auth.get_authorization_header()
+
+        asyncio.run(main())
+        assert len(signing_threads) == 1
+        assert signing_threads[0] is not threading.main_thread()
+
+    def test_key_auth_plugs_into_httpx_client(self, httpx, service_account_key, token_endpoint, access_token):
+        seen = []
+
+        def api(request):
+            seen.append(request.headers["Authorization"])
+            return httpx.Response(200)
+
+        async def main():
+            auth = AsyncKeyAuth(service_account_key, http_client=token_endpoint)
+            async with httpx.AsyncClient(auth=auth, transport=httpx.MockTransport(api)) as client:
+                await client.get("https://dns.api.stackit.cloud/v1/zones")
+            await auth.aclose()
+
+        asyncio.run(main())
+        assert seen == [f"Bearer {access_token}"]
+
+    def test_key_auth_rejects_sync_httpx_client(self, httpx, service_account_key):
+        auth = AsyncKeyAuth(service_account_key)
+        with httpx.Client(auth=auth, transport=httpx.MockTransport(lambda request: httpx.Response(200))) as client:
+            with pytest.raises(RuntimeError):
+                client.get("https://dns.api.stackit.cloud/v1/zones")
+
+    def test_key_auth_without_httpx_uses_default_session(self, service_account_key, access_token, monkeypatch):
+        monkeypatch.setattr(async_key_auth, "httpx", None)
+        response = Mock()
+        response.json.return_value = {"access_token": access_token, "refresh_token": access_token}
+
+        async def main():
+            auth = AsyncKeyAuth(service_account_key)
+            return await auth.get_authorization_header()
+
+        with patch("requests.Session.post", return_value=response) as post:
+            assert asyncio.run(main()) == f"Bearer {access_token}"
+            post.assert_called_once()
+
+    def test_outage_does_not_cause_a_token_request_per_call(self, service_account_key, failing_token_endpoint):
+        async def main():
+            auth = AsyncKeyAuth(
+                service_account_key,
+                http_client=failing_token_endpoint,
+                retry_policy=RetryPolicy(max_attempts=3, backoff=timedelta(0)),
+                circuit_breaker=CircuitBreaker(),
+            )
+            for _ in range(50):
+                with pytest.raises(TokenUnavailableError):
+                    await auth.get_authorization_header()
+
+        asyncio.run(main())
+        # One refresh with its retries, later calls are held back until the retry interval passed
+        assert len(failing_token_endpoint.requests) == 3
+
+    def test_transient_errors_are_retried(self, service_account_key, failing_token_endpoint, access_token):
+        failing_token_endpoint.failures = 2
+
+        async def main():
+            auth = AsyncKeyAuth(
+                service_account_key,
+                http_client=failing_token_endpoint,
+                retry_policy=RetryPolicy(max_attempts=3, backoff=timedelta(0)),
+                circuit_breaker=CircuitBreaker(),
+            )
+            return await auth.get_authorization_header()
+
+        assert asyncio.run(main()) == f"Bearer {access_token}"
+        assert len(failing_token_endpoint.requests) == 3
+        assert len({request.content for request in failing_token_endpoint.requests}) == 3
+
+    def test_open_circuit_pauses_token_requests(self, service_account_key, failing_token_endpoint):
+        circuit_breaker = CircuitBreaker()
+        for _ in range(circuit_breaker.failure_threshold):
+            circuit_breaker.record_failure()
+
+        async def main():
+            auth = AsyncKeyAuth(
+                service_account_key, http_client=failing_token_endpoint, circuit_breaker=circuit_breaker
+            )
+            with pytest.raises(TokenUnavailableError):
+                await auth.get_authorization_header()
+
+        asyncio.run(main())
+        assert len(failing_token_endpoint.requests) == 0
+
+    def test_invalid_token_response_ends_the_circuit_breaker_trial(self, service_account_key, httpx):
+        responses = [httpx.Response(503), httpx.Response(200, text="<html>Down for maintenance</html>")]
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: responses.pop(0)))
+        circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=timedelta(0))
+
+        async def main():
+            # One instance per attempt, so the retry interval of a failed refresh does not hold the second one back
+            for _ in range(2):
+                auth = AsyncKeyAuth(
+                    service_account_key,
+                    http_client=client,
+                    retry_policy=RetryPolicy(max_attempts=1),
+                    circuit_breaker=circuit_breaker,
+                )
+                with pytest.raises(TokenUnavailableError):
+                    await auth.get_authorization_header()
+
+        asyncio.run(main())
+        assert responses == []
+        assert circuit_breaker.allow()
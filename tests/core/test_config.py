@@ -35,3 +35,8 @@ class TestConfig:
     def test_check_valid_server_index(self):
         config = Configuration()
         assert config.server_index == 0
+
+    def test_token_cache_path_is_read_from_environment(self, monkeypatch):
+        monkeypatch.setenv("STACKIT_TOKEN_CACHE_PATH", "/path/to/token/cache")
+        assert Configuration().token_cache_path == "/path/to/token/cache"
+        assert Configuration(token_cache_path="/other/path").token_cache_path == "/other/path"
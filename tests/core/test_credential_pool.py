@@ -0,0 +1,127 @@
+import json
+import time
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+import pytest
+
+from stackit.core.auth_methods.credential_pool import CredentialPool
+
+
+def with_key_id(service_account_key, key_id):
+    credentials = service_account_key.credentials.model_copy(update={"key_id": key_id})
+    return service_account_key.model_copy(update={"credentials": credentials})
+
+
+@pytest.fixture
+def service_account_keys(service_account_key):
+    return [with_key_id(service_account_key, f"key-{i}") for i in range(5)]
+
+
+@pytest.fixture
+def create_pool(service_account_keys, token_endpoint, fake_clock):
+    pools = []
+
+    def create(**kwargs):
+        pool = CredentialPool(service_account_keys, http_session=token_endpoint, clock=fake_clock, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield create
+    for pool in pools:
+        pool.close()
+
+
+class TestCredentialPool:
+    def test_handles_are_created_lazily_and_reused(self, create_pool, token_endpoint):
+        pool = create_pool()
+        assert len(pool) == 5
+        assert "key-0" in pool
+        handle = pool.get("key-0")
+        assert pool["key-0"] is handle
+        assert len(token_endpoint.requests) == 0
+        with pytest.raises(KeyError):
+            pool.get("unknown")
+
+    def test_prefetch_fetches_tokens_with_bounded_concurrency(self, create_pool, token_endpoint):
+        pool = create_pool(max_concurrency=2)
+        token_endpoint.gate.clear()
+        pool.prefetch(wait=False)
+        deadline = time.monotonic() + 5
+        while len(token_endpoint.requests) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        assert len(token_endpoint.requests) == 2
+
+        token_endpoint.gate.set()
+        pool.prefetch()
+        assert len(token_endpoint.requests) == 5
+        request = Mock(headers={})
+        for i in range(5):
+            pool.get(f"key-{i}")(request)
+            assert request.headers["Authorization"] == f"Bearer {pool.get(f'key-{i}').access_token}"
+        # The tokens are valid on the clock of the pool, so using them fetches no new ones
+        assert len(token_endpoint.requests) == 5
+
+    def test_authenticate_returns_handles_and_errors_per_key(self, create_pool, service_account_key, token_endpoint):
+        pool = create_pool()
+        broken_credentials = service_account_key.credentials.model_copy(
+            update={"key_id": "broken", "private_key": "not a private key"}
+        )
+        broken = service_account_key.model_copy(update={"credentials": broken_credentials})
+        keys = [with_key_id(service_account_key, f"new-{i}") for i in range(3)] + [broken]
+
+        result = pool.authenticate(keys)
+        assert sorted(result.auths) == ["new-0", "new-1", "new-2"]
+        assert all(auth.access_token is not None for auth in result.auths.values())
+        assert result.auths["new-0"] is pool.get("new-0")
+        assert list(result.errors) == ["broken"]
+        # The cause is reported, not a generic error, however far the fetch got before it was awaited
+        assert isinstance(result.errors["broken"], ValueError)
+        # Also when the failed fetch finished before and the retry is held back, so nothing is awaited
+        assert isinstance(pool.authenticate([broken]).errors["broken"], ValueError)
+        assert len(token_endpoint.requests) == 3
+
+    def test_session_pools_as_many_connections_as_tokens_are_fetched_at_once(self):
+        with CredentialPool(max_concurrency=32) as pool:
+            adapter = pool.http_session.get_adapter("https://service-account.api.stackit.cloud/token")
+            assert adapter.poolmanager.connection_pool_kw["maxsize"] == 32
+            with patch.object(pool.http_session, "close") as close:
+                pool.close()
+            close.assert_called_once()
+        with CredentialPool(max_concurrency=2) as pool:
+            assert pool.http_session is None
+
+    def test_least_recently_used_handles_are_released_beyond_max_size(self, create_pool):
+        pool = create_pool(max_size=2)
+        first = pool.get("key-0")
+        second = pool.get("key-1")
+        pool.get("key-0")
+        pool.get("key-2")
+        assert pool.get("key-0") is first
+        assert pool.get("key-1") is not second
+
+    def test_idle_handles_are_released(self, create_pool, fake_clock):
+        pool = create_pool(idle_timeout=timedelta(minutes=10))
+        idle = pool.get("key-0")
+        fake_clock.advance(300)
+        active = pool.get("key-1")
+        fake_clock.advance(301)
+        pool.evict_idle()
+        assert pool.get("key-0") is not idle
+        assert pool.get("key-1") is active
+
+    def test_from_directory(self, tmp_path, service_account_key_file_json, private_key_file):
+        key = json.loads(service_account_key_file_json)
+        key["credentials"]["privateKey"] = private_key_file
+        for i in range(3):
+            key["credentials"]["kid"] = f"key-{i}"
+            (tmp_path / f"key-{i}.json").write_text(json.dumps(key))
+        pool = CredentialPool.from_directory(tmp_path)
+        assert len(pool) == 3
+        assert "key-2" in pool
+
+        del key["credentials"]["privateKey"]
+        (tmp_path / "no-private-key.json").write_text(json.dumps(key))
+        with pytest.raises(ValueError, match="no private key"):
+            CredentialPool.from_directory(tmp_path)
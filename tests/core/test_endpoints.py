@@ -0,0 +1,119 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from stackit.core.configuration import Configuration
+from stackit.core.endpoints import EndpointResolver, warm_up
+from stackit.core.http_session import create_session
+
+SERVERS = [
+    {
+        "url": "https://dns.api.{region}stackit.cloud",
+        "variables": {"region": {"default_value": "global.", "enum_values": ["global.", "eu01.", "eu02."]}},
+    },
+    {"url": "https://dns.api.stackit.dev"},
+]
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_HEAD(self):  # noqa: N802 name given by BaseHTTPRequestHandler
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):  # noqa: N802 name given by BaseHTTPRequestHandler
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+    server.connections = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def resolver():
+    resolver = EndpointResolver()
+    resolver.register("dns", SERVERS)
+    return resolver
+
+
+class TestEndpointResolver:
+    def test_region_fills_url_template(self, resolver):
+        assert resolver.resolve("dns") == "https://dns.api.global.stackit.cloud"
+        assert resolver.resolve("dns", "eu01.") == "https://dns.api.eu01.stackit.cloud"
+        assert resolver.resolve("dns", "eu01.", server_index=1) == "https://dns.api.stackit.dev"
+
+    def test_configuration_is_resolved(self, resolver):
+        assert resolver.resolve_configuration("dns", Configuration(region="eu02.")) == (
+            "https://dns.api.eu02.stackit.cloud"
+        )
+        custom = Configuration(region="eu02.", custom_endpoint="http://localhost:8080")
+        assert resolver.resolve_configuration("dns", custom) == "http://localhost:8080"
+
+    def test_urls_are_memoized_until_service_is_registered_again(self, resolver):
+        url = resolver.resolve("dns", "eu01.")
+        assert resolver.resolve("dns", "eu01.") is url
+        resolver.register("dns", [{"url": "https://dns.example.com"}])
+        assert resolver.resolve("dns", "eu01.") == "https://dns.example.com"
+
+    def test_invalid_settings_are_rejected(self, resolver):
+        with pytest.raises(KeyError):
+            resolver.resolve("unknown")
+        with pytest.raises(ValueError, match="server index"):
+            resolver.resolve("dns", server_index=2)
+        with pytest.raises(ValueError, match="region"):
+            resolver.resolve("dns", "xx99.")
+
+
+class TestWarmUp:
+    def test_warmed_up_connection_is_reused(self, server):
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        session = create_session()
+        assert warm_up([url, url], session) == {url: None}
+        assert server.connections == 1
+        assert session.get(url).text == "ok"
+        assert server.connections == 1
+
+    def test_several_connections_are_opened_in_parallel(self, server):
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        assert warm_up([url], create_session(), connections=3) == {url: None}
+        assert 1 <= server.connections <= 3
+
+    def test_unreachable_hosts_are_reported(self, server):
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        server.shutdown()
+        server.server_close()
+        errors = warm_up([url], create_session(max_retries=0), timeout=1)
+        assert errors[url] is not None
+
+    def test_resolver_warms_up_through_session_of_configuration(self, resolver, server):
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        session = create_session()
+        configuration = Configuration(custom_endpoint=url, custom_http_session=session)
+        assert resolver.warm_up(["dns"], configuration) == {url: None}
+        session.get(url)
+        assert server.connections == 1
+
+    def test_resolver_does_not_warm_up_sessions_clients_do_not_use(self, resolver, server):
+        with pytest.raises(ValueError, match="custom_http_session"):
+            resolver.warm_up(["dns"], Configuration(custom_endpoint=f"http://127.0.0.1:{server.server_address[1]}"))
+        assert server.connections == 0
@@ -0,0 +1,61 @@
+import os
+from unittest.mock import Mock
+
+from stackit.core.file_cache import FileCache
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+class TestFileCache:
+    def test_file_is_loaded_once(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_text("content")
+        loader = Mock(side_effect=read)
+        cache = FileCache()
+        assert cache.get(path, loader) == "content"
+        assert cache.get(str(path), loader) == "content"
+        loader.assert_called_once()
+
+    def test_changed_file_is_loaded_again(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_text("content")
+        cache = FileCache()
+        assert cache.get(path, read) == "content"
+        path.write_text("changed content")
+        assert cache.get(path, read) == "changed content"
+
+    def test_replaced_file_is_loaded_again(self, tmp_path):
+        path, replacement = tmp_path / "file", tmp_path / "replacement"
+        path.write_text("content")
+        cache = FileCache()
+        assert cache.get(path, read) == "content"
+        replacement.write_text("rotated")
+        stat = os.stat(path)
+        os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(replacement, path)
+        assert cache.get(path, read) == "rotated"
+
+    def test_loaders_are_cached_separately(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_text("content")
+        cache = FileCache()
+        assert cache.get(path, read) == "content"
+        assert cache.get(path, lambda p: read(p).upper()) == "CONTENT"
+
+    def test_missing_file_is_not_cached(self, tmp_path):
+        loader = Mock(return_value="default")
+        cache = FileCache()
+        assert cache.get(tmp_path / "missing", loader) == "default"
+        assert cache.get(tmp_path / "missing", loader) == "default"
+        assert loader.call_count == 2
+        assert len(cache) == 0
+
+    def test_least_recently_used_entries_are_evicted(self, tmp_path):
+        cache = FileCache(max_size=2)
+        for name in ("a", "b", "c"):
+            (tmp_path / name).write_text(name)
+            cache.get(tmp_path / name, read)
+        assert len(cache) == 2
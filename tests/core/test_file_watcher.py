@@ -0,0 +1,122 @@
+import gc
+import os
+import threading
+from datetime import timedelta
+from unittest.mock import Mock
+
+from stackit.core.file_watcher import FileWatcher
+
+
+def replace_file(path, content):
+    replacement = path.with_name(path.name + ".new")
+    replacement.write_text(content)
+    os.replace(replacement, path)
+
+
+class Listener:
+    def __init__(self):
+        self.calls = 0
+
+    def changed(self):
+        self.calls += 1
+
+
+class TestFileWatcher:
+    def test_changed_file_is_reported_once(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_text("content")
+        callback = Mock()
+        watcher = FileWatcher()
+        watcher.watch([path], callback)
+
+        watcher.check()
+        callback.assert_not_called()
+        replace_file(path, "rotated")
+        watcher.check()
+        watcher.check()
+        callback.assert_called_once()
+        watcher.close()
+
+    def test_file_swapped_through_symlinked_directory_is_reported(self, tmp_path):
+        # The layout of Kubernetes secret volumes: key -> ..data/key, ..data -> a versioned directory
+        (tmp_path / "v1").mkdir()
+        (tmp_path / "v1" / "key").write_text("first")
+        (tmp_path / "..data").symlink_to("v1")
+        (tmp_path / "key").symlink_to("..data/key")
+        callback = Mock()
+        watcher = FileWatcher()
+        watcher.watch([tmp_path / "key"], callback)
+
+        (tmp_path / "v2").mkdir()
+        (tmp_path / "v2" / "key").write_text("second")
+        (tmp_path / "..data.new").symlink_to("v2")
+        os.replace(tmp_path / "..data.new", tmp_path / "..data")
+        watcher.check()
+        callback.assert_called_once()
+        watcher.close()
+
+    def test_appearing_and_disappearing_files_are_reported(self, tmp_path):
+        path = tmp_path / "file"
+        callback = Mock()
+        watcher = FileWatcher()
+        watcher.watch([path], callback)
+
+        path.write_text("content")
+        watcher.check()
+        path.unlink()
+        watcher.check()
+        assert callback.call_count == 2
+        watcher.close()
+
+    def test_cancelled_watch_is_not_reported(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_text("content")
+        callback = Mock()
+        watcher = FileWatcher()
+        watch = watcher.watch([path], callback)
+
+        watch.cancel()
+        replace_file(path, "rotated")
+        watcher.check()
+        callback.assert_not_called()
+        assert len(watcher) == 0
+
+    def test_objects_of_bound_methods_are_not_kept_alive(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_text("content")
+        watcher = FileWatcher()
+        listener = Listener()
+        watcher.watch([path], listener.changed)
+
+        replace_file(path, "rotated")
+        watcher.check()
+        assert listener.calls == 1
+        del listener
+        gc.collect()
+        watcher.check()
+        assert len(watcher) == 0
+
+    def test_failing_callback_does_not_stop_other_watches(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_text("content")
+        failing, callback = Mock(side_effect=ValueError("invalid")), Mock()
+        watcher = FileWatcher()
+        watcher.watch([path], failing)
+        watcher.watch([path], callback)
+
+        replace_file(path, "rotated")
+        watcher.check()
+        failing.assert_called_once()
+        callback.assert_called_once()
+        watcher.close()
+
+    def test_watcher_thread_polls_files(self, tmp_path):
+        path = tmp_path / "file"
+        path.write_text("content")
+        changed = threading.Event()
+        watcher = FileWatcher(interval=timedelta(milliseconds=10))
+        watcher.watch([path], changed.set)
+
+        replace_file(path, "rotated")
+        assert changed.wait(timeout=5)
+        watcher.close()
@@ -0,0 +1,105 @@
+import os
+import traceback
+from datetime import timedelta
+
+import pytest
+
+from stackit.core.auth_methods.credential_pool import CredentialPool
+from stackit.core.auth_methods.refresh_scheduler import RefreshScheduler
+from stackit.core.auth_methods.token_provider import TokenProvider
+from stackit.core.auth_methods.token_state import RefreshPolicy
+from stackit.core.http_session import get_default_session
+from tests.core.conftest import REFRESH_BEFORE, TOKEN_LIFETIME
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="os.fork is not available")
+
+
+def run_in_child(check):
+    """Run check in a forked child process and return its exit code, 0 if check passed."""
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            check()
+            code = 0
+        except Exception:
+            traceback.print_exc()
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return os.WEXITSTATUS(status)
+
+
+@pytest.fixture
+def provider(service_account_key, token_endpoint, fake_clock):
+    scheduler = RefreshScheduler()
+    provider = TokenProvider(
+        service_account_key,
+        "https://service-account.api.stackit.cloud/token",
+        token_endpoint,
+        scheduler,
+        RefreshPolicy(refresh_before=timedelta(seconds=REFRESH_BEFORE), jitter=timedelta(seconds=60)),
+        fake_clock,
+    )
+    provider.start()
+    yield provider
+    provider.close()
+    scheduler.close()
+
+
+class TestFork:
+    def test_child_keeps_valid_token(self, provider, token_endpoint):
+        token = provider.access_token
+
+        def check():
+            assert provider.current_token_state().token == token
+            assert len(token_endpoint.requests) == 1
+
+        assert run_in_child(check) == 0
+
+    def test_child_refreshes_although_parent_held_lock(self, provider, token_endpoint, fake_clock):
+        token = provider.access_token
+
+        def check():
+            fake_clock.advance(TOKEN_LIFETIME)
+            assert provider.current_token_state().token != token
+            assert len(token_endpoint.requests) == 2
+
+        with provider.lock:
+            assert run_in_child(check) == 0
+        assert provider.access_token == token
+
+    def test_child_draws_its_own_refresh_jitter(self, provider):
+        refresh_at = provider.access_token_state.refresh_at
+        deadline = provider.scheduler.deadline(provider)
+        assert deadline is not None
+
+        def check():
+            # The jitter is drawn from a 60 second range, so the chance of drawing the same one is negligible
+            assert provider.access_token_state.refresh_at != refresh_at
+            # The refresh is scheduled for the new refresh_at, with the same lead for signing the assertion
+            lead = refresh_at - deadline
+            assert provider.scheduler.deadline(provider) == provider.access_token_state.refresh_at - lead
+
+        assert run_in_child(check) == 0
+
+    def test_child_does_not_share_pooled_connections(self):
+        adapter = get_default_session().get_adapter("https://service-account.api.stackit.cloud")
+        adapter.poolmanager.connection_from_url("https://service-account.api.stackit.cloud")
+
+        def check():
+            assert len(adapter.poolmanager.pools) == 0
+
+        assert run_in_child(check) == 0
+        assert len(adapter.poolmanager.pools) > 0
+
+    def test_child_does_not_share_connections_of_pool_session(self):
+        with CredentialPool(max_concurrency=32) as pool:
+            adapter = pool.http_session.get_adapter("https://service-account.api.stackit.cloud")
+            adapter.poolmanager.connection_from_url("https://service-account.api.stackit.cloud")
+
+            def check():
+                assert len(adapter.poolmanager.pools) == 0
+
+            assert run_in_child(check) == 0
+            assert len(adapter.poolmanager.pools) > 0
@@ -0,0 +1,13 @@
+from stackit.core.http_session import create_session, get_default_session
+
+
+class TestHttpSession:
+    def test_default_session_is_shared(self):
+        assert get_default_session() is get_default_session()
+
+    def test_session_adapter_uses_given_pool_settings(self):
+        session = create_session(pool_connections=2, pool_maxsize=20, max_retries=5)
+        adapter = session.get_adapter("https://service-account.api.stackit.cloud/token")
+        assert adapter._pool_connections == 2
+        assert adapter._pool_maxsize == 20
+        assert adapter.max_retries.total == 5
@@ -0,0 +1,83 @@
+import gc
+import threading
+import time
+import weakref
+
+import pytest
+
+from stackit.core.auth_methods.refresh_scheduler import RefreshScheduler
+
+
+class Target:
+    def __init__(self):
+        self.due = threading.Event()
+
+    def refresh_due(self):
+        self.due.set()
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = RefreshScheduler()
+    yield scheduler
+    scheduler.close()
+
+
+class TestRefreshScheduler:
+    def test_target_is_refreshed_at_its_deadline(self, scheduler):
+        target = Target()
+        scheduled_at = time.monotonic()
+        scheduler.schedule(target, scheduled_at + 0.05)
+        assert target.due.wait(timeout=5)
+        assert time.monotonic() >= scheduled_at + 0.05
+        assert len(scheduler) == 0
+
+    def test_earlier_deadline_wakes_up_scheduler(self, scheduler):
+        late, early = Target(), Target()
+        scheduler.schedule(late, time.monotonic() + 60)
+        scheduler.schedule(early, time.monotonic() + 0.05)
+        assert early.due.wait(timeout=5)
+        assert not late.due.is_set()
+
+    def test_rescheduling_replaces_previous_deadline(self, scheduler):
+        target = Target()
+        scheduler.schedule(target, time.monotonic() + 0.05)
+        scheduler.schedule(target, time.monotonic() + 60)
+        assert not target.due.wait(timeout=0.2)
+        assert len(scheduler) == 1
+
+    def test_unscheduled_target_is_not_refreshed(self, scheduler):
+        target = Target()
+        scheduler.schedule(target, time.monotonic() + 0.05)
+        scheduler.unschedule(target)
+        assert not target.due.wait(timeout=0.2)
+
+    def test_scheduler_only_holds_weak_references(self, scheduler):
+        target = Target()
+        target_ref = weakref.ref(target)
+        scheduler.schedule(target, time.monotonic() + 60)
+        del target
+        gc.collect()
+        assert target_ref() is None
+        assert len(scheduler) == 0
+
+    def test_many_targets_share_one_thread(self, scheduler):
+        threads_before = threading.active_count()
+        targets = [Target() for _ in range(1000)]
+        for target in targets:
+            scheduler.schedule(target, time.monotonic() + 0.05)
+        assert all(target.due.wait(timeout=5) for target in targets)
+        assert threading.active_count() <= threads_before + 1 + RefreshScheduler.DEFAULT_MAX_WORKERS
+
+    def test_close_stops_scheduler_thread(self, scheduler):
+        def scheduler_threads():
+            return {thread for thread in threading.enumerate() if thread.name == "stackit-token-scheduler"}
+
+        threads_before = scheduler_threads()
+        target = Target()
+        scheduler.schedule(target, time.monotonic() + 60)
+        assert len(scheduler_threads() - threads_before) == 1
+        scheduler.close()
+        time.sleep(0.1)
+        assert scheduler_threads() - threads_before == set()
+        assert len(scheduler) == 0
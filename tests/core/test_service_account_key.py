@@ -0,0 +1,80 @@
+import json
+import pickle  # noqa: S403 round trips keys pickled by the test itself
+
+import jwt
+import pytest
+
+from stackit.core.auth_methods.assertion import create_assertion
+from stackit.core.auth_methods.credential_pool import CredentialPool
+from stackit.core.auth_methods.key_auth import KeyAuth
+from stackit.core.auth_methods.service_account_key import CompactServiceAccountKey
+
+
+@pytest.fixture
+def key_file_json(service_account_key_file_json, private_key_file):
+    key = json.loads(service_account_key_file_json)
+    key["credentials"]["privateKey"] = private_key_file
+    return json.dumps(key)
+
+
+class TestCompactServiceAccountKey:
+    def test_keeps_fields_of_model(self, key_file_json, service_account_key):
+        compact = CompactServiceAccountKey.from_json(key_file_json)
+        assert compact.id == service_account_key.id
+        assert compact.active is service_account_key.active
+        for name in ("audience", "issuer", "key_id", "private_key", "subject"):
+            assert getattr(compact.credentials, name) == getattr(service_account_key.credentials, name)
+        from_model = CompactServiceAccountKey.from_model(service_account_key)
+        assert pickle.dumps(from_model) == pickle.dumps(compact)
+
+    def test_is_immutable_and_picklable(self, key_file_json):
+        compact = CompactServiceAccountKey.from_json(key_file_json)
+        with pytest.raises(AttributeError):
+            compact.id = "other"
+        with pytest.raises(AttributeError):
+            compact.credentials.private_key = None
+        with pytest.raises(AttributeError):
+            compact.extra = 1
+        copy = pickle.loads(pickle.dumps(compact))  # noqa: S301 pickled just before
+        assert copy.credentials.key_id == compact.credentials.key_id
+        assert copy.credentials.private_key == compact.credentials.private_key
+
+    def test_private_key_is_optional(self, service_account_key_file_json, private_key_file):
+        compact = CompactServiceAccountKey.from_json(service_account_key_file_json)
+        assert compact.credentials.private_key is None
+        assert compact.with_private_key(private_key_file).credentials.private_key == private_key_file
+
+    @pytest.mark.parametrize(
+        "change",
+        [
+            lambda key: key.pop("id"),
+            lambda key: key.update(active="true"),
+            lambda key: key.update(credentials=[]),
+            lambda key: key["credentials"].pop("kid"),
+            lambda key: key["credentials"].update(privateKey=1),
+        ],
+    )
+    def test_invalid_fields_are_rejected(self, key_file_json, change):
+        key = json.loads(key_file_json)
+        change(key)
+        with pytest.raises(ValueError):
+            CompactServiceAccountKey.from_json(json.dumps(key))
+
+    def test_signs_same_assertion_as_model(self, key_file_json, service_account_key):
+        compact = CompactServiceAccountKey.from_json(key_file_json)
+        claims = jwt.decode(create_assertion(compact), options={"verify_signature": False})
+        expected = jwt.decode(create_assertion(service_account_key), options={"verify_signature": False})
+        assert {name: claims[name] for name in ("iss", "sub", "aud")} == {
+            name: expected[name] for name in ("iss", "sub", "aud")
+        }
+
+    def test_authenticates(self, key_file_json, token_endpoint):
+        with KeyAuth(CompactServiceAccountKey.from_json(key_file_json), http_session=token_endpoint) as auth:
+            assert auth.access_token is not None
+
+    def test_trusted_key_files_are_loaded_compact(self, tmp_path, key_file_json):
+        (tmp_path / "key.json").write_text(key_file_json)
+        with CredentialPool.from_directory(tmp_path, trusted=True) as pool:
+            assert len(pool) == 1
+            key_id = json.loads(key_file_json)["credentials"]["kid"]
+            assert isinstance(pool[key_id].service_account_key, CompactServiceAccountKey)
@@ -0,0 +1,99 @@
+import os
+import stat
+import threading
+from datetime import timedelta
+
+from stackit.core.auth_methods.refresh_scheduler import RefreshScheduler
+from stackit.core.auth_methods.token_cache import FileTokenCache
+from stackit.core.auth_methods.token_provider import TokenProvider
+from stackit.core.auth_methods.token_state import RefreshPolicy
+from tests.core.conftest import REFRESH_BEFORE, TOKEN_LIFETIME
+
+KEY_ID = "35b250fb-3186-47ca-8dc2-1b4632272785"
+TOKEN_ENDPOINT = "https://service-account.api.stackit.cloud/token"
+
+
+def create_provider(service_account_key, token_endpoint, fake_clock, scheduler, cache_directory):
+    return TokenProvider(
+        service_account_key,
+        TOKEN_ENDPOINT,
+        token_endpoint,
+        scheduler,
+        RefreshPolicy(refresh_before=timedelta(seconds=REFRESH_BEFORE), jitter=timedelta(0)),
+        fake_clock,
+        FileTokenCache(str(cache_directory)),
+    )
+
+
+class TestFileTokenCache:
+    def test_stored_tokens_are_loaded(self, tmp_path):
+        cache = FileTokenCache(str(tmp_path / "cache"))
+        assert cache.load(KEY_ID, TOKEN_ENDPOINT) is None
+        cache.store(KEY_ID, TOKEN_ENDPOINT, "access", "refresh")
+        assert cache.load(KEY_ID, TOKEN_ENDPOINT) == ("access", "refresh")
+        assert cache.load(KEY_ID, "https://other.example/token") is None
+
+    def test_cache_is_only_readable_by_owner(self, tmp_path):
+        cache = FileTokenCache(str(tmp_path / "cache"))
+        cache.store(KEY_ID, TOKEN_ENDPOINT, "access", "refresh")
+        assert stat.S_IMODE(os.stat(cache.directory).st_mode) == 0o700
+        for path in cache.directory.iterdir():
+            assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    def test_store_replaces_cache_file_atomically(self, tmp_path):
+        cache = FileTokenCache(str(tmp_path / "cache"))
+        cache.store(KEY_ID, TOKEN_ENDPOINT, "old-access", "old-refresh")
+        cache.store(KEY_ID, TOKEN_ENDPOINT, "access", "refresh")
+        assert cache.load(KEY_ID, TOKEN_ENDPOINT) == ("access", "refresh")
+        assert [path.suffix for path in cache.directory.iterdir()] == [".json"]
+
+    def test_corrupt_cache_file_is_ignored(self, tmp_path):
+        cache = FileTokenCache(str(tmp_path / "cache"))
+        cache.store(KEY_ID, TOKEN_ENDPOINT, "access", "refresh")
+        for path in cache.directory.iterdir():
+            path.write_text("{")
+        assert cache.load(KEY_ID, TOKEN_ENDPOINT) is None
+
+    def test_providers_sharing_a_cache_fetch_one_token(self, service_account_key, token_endpoint, fake_clock, tmp_path):
+        scheduler = RefreshScheduler()
+        providers = [
+            create_provider(service_account_key, token_endpoint, fake_clock, scheduler, tmp_path) for _ in range(8)
+        ]
+        threads = [threading.Thread(target=provider.start) for provider in providers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(token_endpoint.requests) == 1
+        assert len({provider.access_token for provider in providers}) == 1
+        scheduler.close()
+
+    def test_provider_picks_up_token_refreshed_by_another_process(
+        self, service_account_key, token_endpoint, fake_clock, tmp_path
+    ):
+        scheduler = RefreshScheduler()
+        first = create_provider(service_account_key, token_endpoint, fake_clock, scheduler, tmp_path)
+        second = create_provider(service_account_key, token_endpoint, fake_clock, scheduler, tmp_path)
+        first.start()
+        second.start()
+
+        fake_clock.advance(TOKEN_LIFETIME - REFRESH_BEFORE)
+        first.wait_for_token()
+        first.refresh_future.result(timeout=5)
+        second.wait_for_token()
+        second.refresh_future.result(timeout=5)
+
+        assert len(token_endpoint.requests) == 2
+        assert second.access_token == first.access_token
+        scheduler.close()
+
+    def test_unavailable_cache_falls_back_to_token_endpoint(
+        self, service_account_key, token_endpoint, fake_clock, tmp_path
+    ):
+        (tmp_path / "file").write_text("")
+        scheduler = RefreshScheduler()
+        provider = create_provider(service_account_key, token_endpoint, fake_clock, scheduler, tmp_path / "file")
+        provider.start()
+        assert provider.access_token is not None
+        scheduler.close()
@@ -0,0 +1,435 @@
+import io
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import Mock
+
+import jwt
+import pytest
+import requests
+
+from stackit.core.auth_methods.instrumentation import (
+    REFRESH_FAILED,
+    REFRESH_FROM_ENDPOINT,
+    TokenInstrumentation,
+)
+from stackit.core.auth_methods.key_auth import KeyAuth
+from stackit.core.auth_methods.refresh_scheduler import RefreshScheduler
+from stackit.core.auth_methods.token_provider import TokenProvider, TokenRegistry, TokenUnavailableError
+from stackit.core.auth_methods.token_retry import CircuitOpenError, RetryPolicy
+from stackit.core.auth_methods.token_state import RefreshPolicy
+from tests.core.conftest import REFRESH_BEFORE, TOKEN_LIFETIME
+
+
+class UnauthorizedAdapter(requests.adapters.BaseAdapter):
+    """Answers with 401 to requests with a rejected token, or to all requests if reject_all is set"""
+
+    def __init__(self):
+        super().__init__()
+        self.rejected_headers = set()
+        self.reject_all = False
+        self.headers = []
+        self.bodies = []
+
+    def send(self, request, **kwargs):
+        authorization = request.headers.get("Authorization")
+        self.headers.append(authorization)
+        self.bodies.append(request.body.read() if hasattr(request.body, "read") else request.body)
+        response = requests.Response()
+        response.status_code = 401 if self.reject_all or authorization in self.rejected_headers else 200
+        response.raw = io.BytesIO(b"")
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+class RedirectAdapter(requests.adapters.BaseAdapter):
+    """Redirects all requests to location"""
+
+    def __init__(self, location):
+        super().__init__()
+        self.location = location
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 302
+        response.headers["Location"] = self.location
+        response.raw = io.BytesIO(b"")
+        response.request = request
+        response.url = request.url
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+
+class RecordingInstrumentation(TokenInstrumentation):
+    def __init__(self):
+        self.requests = []
+        self.refreshes = []
+        self.uses = []
+
+    def token_requested(self, grant_type, duration, status_code, error):
+        self.requests.append((grant_type, status_code, error))
+
+    def token_refreshed(self, source, duration, expires_in):
+        self.refreshes.append((source, expires_in))
+
+    def token_used(self, wait, refreshed, expires_in):
+        self.uses.append((wait, refreshed))
+
+
+@pytest.fixture
+def instrumentation():
+    return RecordingInstrumentation()
+
+
+@pytest.fixture
+def create_provider(service_account_key, token_endpoint, fake_clock, instrumentation):
+    scheduler = RefreshScheduler()
+    providers = []
+
+    def create(**kwargs):
+        provider = TokenProvider(
+            service_account_key,
+            "https://service-account.api.stackit.cloud/token",
+            token_endpoint,
+            scheduler,
+            RefreshPolicy(refresh_before=timedelta(seconds=REFRESH_BEFORE), jitter=timedelta(0)),
+            fake_clock,
+            instrumentation=instrumentation,
+            **kwargs,
+        )
+        providers.append(provider)
+        return provider
+
+    yield create
+    for provider in providers:
+        provider.close()
+    scheduler.close()
+
+
+@pytest.fixture
+def provider(create_provider):
+    # Without retries every refresh is a single request
+    provider = create_provider(retry_policy=RetryPolicy(max_attempts=1))
+    provider.start()
+    return provider
+
+
+def fail_first_requests(token_endpoint, count, headers=None):
+    post = token_endpoint.post
+
+    def recovering_post(url, data, **kwargs):
+        token_endpoint.failing = len(token_endpoint.requests) < count
+        response = post(url, data, **kwargs)
+        response.headers = headers if headers is not None else {}
+        return response
+
+    token_endpoint.post = recovering_post
+
+
+def wait_for_refresh(provider):
+    if provider.refresh_future is not None:
+        provider.refresh_future.result(timeout=5)
+
+
+class TestTokenProvider:
+    def test_valid_token_is_reused(self, provider, token_endpoint, fake_clock):
+        token = provider.current_token_state().token
+        fake_clock.advance(TOKEN_LIFETIME - REFRESH_BEFORE - 1)
+        assert provider.current_token_state().token == token
+        assert len(token_endpoint.requests) == 1
+
+    def test_token_due_for_refresh_is_used_while_refreshing_in_background(self, provider, token_endpoint, fake_clock):
+        old_token = provider.current_token_state().token
+        token_endpoint.gate.clear()
+        fake_clock.advance(TOKEN_LIFETIME - REFRESH_BEFORE)
+
+        assert provider.current_token_state().token == old_token
+        assert provider.current_token_state().token == old_token
+        token_endpoint.gate.set()
+        wait_for_refresh(provider)
+
+        assert provider.current_token_state().token != old_token
+        assert len(token_endpoint.requests) == 2
+        assert token_endpoint.requests[1]["grant_type"] == "refresh_token"
+
+    def test_expired_token_waits_for_in_flight_refresh(self, provider, token_endpoint, fake_clock):
+        old_token = provider.current_token_state().token
+        token_endpoint.gate.clear()
+        fake_clock.advance(TOKEN_LIFETIME)
+
+        tokens = []
+        waiters = [
+            threading.Thread(target=lambda: tokens.append(provider.current_token_state().token)) for _ in range(8)
+        ]
+        for waiter in waiters:
+            waiter.start()
+        for waiter in waiters:
+            waiter.join(timeout=0.1)
+        assert all(waiter.is_alive() for waiter in waiters)
+
+        token_endpoint.gate.set()
+        for waiter in waiters:
+            waiter.join(timeout=5)
+        assert len(tokens) == 8
+        assert old_token not in tokens
+        assert len(set(tokens)) == 1
+        assert len(token_endpoint.requests) == 2
+
+    def test_failed_refresh_is_not_retried_on_every_request(self, provider, token_endpoint, fake_clock):
+        old_token = provider.current_token_state().token
+        token_endpoint.failing = True
+        fake_clock.advance(TOKEN_LIFETIME - REFRESH_BEFORE)
+
+        for _ in range(10):
+            assert provider.current_token_state().token == old_token
+            wait_for_refresh(provider)
+        assert len(token_endpoint.requests) == 2
+
+        token_endpoint.failing = False
+        fake_clock.advance(TokenProvider.REFRESH_RETRY_INTERVAL.total_seconds())
+        provider.current_token_state()
+        wait_for_refresh(provider)
+        assert provider.current_token_state().token != old_token
+        assert len(token_endpoint.requests) == 3
+
+    def test_expired_token_is_not_used_when_refresh_fails(self, provider, token_endpoint, fake_clock):
+        provider.current_token_state()
+        token_endpoint.failing = True
+        fake_clock.advance(TOKEN_LIFETIME)
+
+        # The first call waits for a failing refresh, the others are held back until the retry
+        for _ in range(3):
+            with pytest.raises(TokenUnavailableError):
+                provider.current_token_state()
+        assert len(token_endpoint.requests) == 2
+
+        token_endpoint.failing = False
+        fake_clock.advance(TokenProvider.REFRESH_RETRY_INTERVAL.total_seconds())
+        assert provider.current_token_state().token is not None
+        assert len(token_endpoint.requests) == 3
+
+    def test_expired_refresh_token_is_replaced_with_new_assertion(self, provider, token_endpoint, fake_clock):
+        fake_clock.advance(2 * TOKEN_LIFETIME)
+        provider.current_token_state()
+        assert token_endpoint.requests[1]["grant_type"] == "urn:ietf:params:oauth:grant-type:jwt-bearer"
+
+    def test_instrumentation_receives_requests_and_refreshes(
+        self, provider, token_endpoint, fake_clock, instrumentation
+    ):
+        assert instrumentation.requests == [("urn:ietf:params:oauth:grant-type:jwt-bearer", 200, None)]
+        assert instrumentation.refreshes == [(REFRESH_FROM_ENDPOINT, TOKEN_LIFETIME)]
+
+        token_endpoint.failing = True
+        fake_clock.advance(TOKEN_LIFETIME - REFRESH_BEFORE)
+        provider.current_token_state()
+        wait_for_refresh(provider)
+        grant_type, status_code, error = instrumentation.requests[1]
+        assert (grant_type, status_code) == ("refresh_token", 503)
+        assert error is not None
+        assert instrumentation.refreshes[1] == (REFRESH_FAILED, REFRESH_BEFORE)
+
+    def test_key_auth_reports_token_use(self, service_account_key, token_endpoint, instrumentation, fake_clock):
+        auth = KeyAuth(
+            service_account_key,
+            http_session=token_endpoint,
+            token_registry=TokenRegistry(RefreshScheduler(), fake_clock),
+            instrumentation=instrumentation,
+        )
+        request = Mock(headers={})
+        auth(request)
+        auth(request)
+        assert request.headers["Authorization"] == f"Bearer {auth.access_token}"
+        assert [refreshed for _, refreshed in instrumentation.uses] == [False, False]
+        assert all(wait >= 0 for wait, _ in instrumentation.uses)
+
+    def test_transient_errors_are_retried_with_backoff_and_new_assertions(
+        self, create_provider, token_endpoint, fake_clock
+    ):
+        fail_first_requests(token_endpoint, 2)
+        provider = create_provider(retry_policy=RetryPolicy(max_attempts=3, backoff=timedelta(seconds=1)))
+        provider.start()
+
+        assert provider.access_token is not None
+        assert len(token_endpoint.requests) == 3
+        assert len({request["assertion"] for request in token_endpoint.requests}) == 3
+        assert len(fake_clock.sleeps) == 2
+        assert 0 <= fake_clock.sleeps[0] <= 1
+        assert 0 <= fake_clock.sleeps[1] <= 2
+
+    def test_retry_after_is_honored(self, create_provider, token_endpoint, fake_clock):
+        fail_first_requests(token_endpoint, 1, headers={"Retry-After": "7"})
+        provider = create_provider()
+        provider.start()
+
+        assert provider.access_token is not None
+        assert fake_clock.sleeps == [7]
+
+    def test_requests_without_token_fail_instead_of_sending_bearer_none(self, create_provider, token_endpoint):
+        token_endpoint.failing = True
+        provider = create_provider(retry_policy=RetryPolicy(max_attempts=1))
+        provider.start()
+
+        with pytest.raises(TokenUnavailableError):
+            provider.current_token_state()
+
+    def test_open_circuit_pauses_token_requests_of_all_providers_of_endpoint(
+        self, service_account_key, token_endpoint, instrumentation
+    ):
+        token_endpoint.failing = True
+        registry = TokenRegistry(RefreshScheduler())
+        provider = registry.acquire(
+            service_account_key, "https://token", token_endpoint, instrumentation=instrumentation
+        )
+        circuit_breaker = provider.circuit_breaker
+        for _ in range(circuit_breaker.failure_threshold):
+            circuit_breaker.record_failure()
+        provider.start()
+
+        assert len(token_endpoint.requests) == 0
+        assert isinstance(instrumentation.requests[0][2], CircuitOpenError)
+        other_key = service_account_key.model_copy(
+            update={"credentials": service_account_key.credentials.model_copy(update={"key_id": "other"})}
+        )
+        assert registry.acquire(other_key, "https://token", token_endpoint).circuit_breaker is circuit_breaker
+
+    def test_rejected_token_is_replaced_once_for_concurrent_callers(self, provider, token_endpoint):
+        rejected = provider.current_token_state()
+        token_endpoint.gate.clear()
+        tokens = []
+        callers = [
+            threading.Thread(target=lambda: tokens.append(provider.invalidate(rejected).token)) for _ in range(8)
+        ]
+        for caller in callers:
+            caller.start()
+        token_endpoint.gate.set()
+        for caller in callers:
+            caller.join(timeout=5)
+
+        assert len(tokens) == 8
+        assert len(set(tokens)) == 1
+        assert rejected.token not in tokens
+        assert len(token_endpoint.requests) == 2
+        assert token_endpoint.requests[1]["grant_type"] == "urn:ietf:params:oauth:grant-type:jwt-bearer"
+
+    def test_tokens_are_not_replaced_again_within_invalidation_interval(self, provider, token_endpoint, fake_clock):
+        replacement = provider.invalidate(provider.current_token_state())
+        assert provider.invalidate(replacement) is replacement
+        assert len(token_endpoint.requests) == 2
+
+        fake_clock.advance(TokenProvider.INVALIDATION_INTERVAL.total_seconds())
+        assert provider.invalidate(replacement) is not replacement
+        assert len(token_endpoint.requests) == 3
+
+    def test_key_auth_replays_request_rejected_with_401_with_new_token(
+        self, service_account_key, token_endpoint, fake_clock
+    ):
+        auth = KeyAuth(
+            service_account_key,
+            http_session=token_endpoint,
+            token_registry=TokenRegistry(RefreshScheduler(), fake_clock),
+        )
+        adapter = UnauthorizedAdapter()
+        session = requests.Session()
+        session.mount("https://api.stackit.cloud/", adapter)
+        revoked_header = f"Bearer {auth.access_token}"
+        adapter.rejected_headers.add(revoked_header)
+
+        response = session.post("https://api.stackit.cloud/v1/resource", data=io.BytesIO(b"payload"), auth=auth)
+
+        assert response.status_code == 200
+        assert [r.status_code for r in response.history] == [401]
+        assert adapter.headers == [revoked_header, f"Bearer {auth.access_token}"]
+        assert adapter.bodies == [b"payload", b"payload"]
+        assert len(token_endpoint.requests) == 2
+
+    def test_key_auth_does_not_replay_to_host_it_was_redirected_to(
+        self, service_account_key, token_endpoint, fake_clock
+    ):
+        auth = KeyAuth(
+            service_account_key,
+            http_session=token_endpoint,
+            token_registry=TokenRegistry(RefreshScheduler(), fake_clock),
+        )
+        other_host = UnauthorizedAdapter()
+        other_host.reject_all = True
+        session = requests.Session()
+        session.mount("https://api.stackit.cloud/", RedirectAdapter("https://other.example/x"))
+        session.mount("https://other.example/", other_host)
+
+        response = session.get("https://api.stackit.cloud/v1/resource", auth=auth)
+
+        assert response.status_code == 401
+        # The token was stripped on the redirect and no new one was sent after the 401
+        assert other_host.headers == [None]
+        assert len(token_endpoint.requests) == 1
+
+    def test_key_auth_fetches_one_token_when_new_tokens_are_rejected_too(
+        self, service_account_key, token_endpoint, fake_clock
+    ):
+        auth = KeyAuth(
+            service_account_key,
+            http_session=token_endpoint,
+            token_registry=TokenRegistry(RefreshScheduler(), fake_clock),
+        )
+        adapter = UnauthorizedAdapter()
+        session = requests.Session()
+        session.mount("https://api.stackit.cloud/", adapter)
+        adapter.reject_all = True
+
+        responses = [session.get("https://api.stackit.cloud/v1/resource", auth=auth) for _ in range(5)]
+
+        assert [response.status_code for response in responses] == [401] * 5
+        assert len(token_endpoint.requests) == 2
+
+    def test_concurrent_requests_during_refreshes_always_see_a_published_token(
+        self, service_account_key, token_endpoint, fake_clock
+    ):
+        scheduler = RefreshScheduler()
+        auth = KeyAuth(
+            service_account_key,
+            http_session=token_endpoint,
+            token_registry=TokenRegistry(scheduler, fake_clock),
+            refresh_policy=RefreshPolicy(refresh_before=timedelta(seconds=REFRESH_BEFORE), jitter=timedelta(0)),
+        )
+        stop = threading.Event()
+        errors = []
+
+        def send_requests():
+            request = Mock(headers={})
+            last_issued = 0
+            while not stop.is_set():
+                try:
+                    auth(request)
+                    token = request.headers["Authorization"][len("Bearer ") :]
+                    issued = jwt.decode(token, options={"verify_signature": False})["n"]
+                except Exception as e:
+                    errors.append(e)
+                    return
+                if issued < last_issued:
+                    errors.append(AssertionError(f"token {issued} was used after token {last_issued}"))
+                last_issued = issued
+
+        threads = [threading.Thread(target=send_requests) for _ in range(32)]
+        for thread in threads:
+            thread.start()
+        cycles = 20
+        for cycle in range(cycles):
+            fake_clock.advance(TOKEN_LIFETIME - REFRESH_BEFORE)
+            deadline = time.monotonic() + 5
+            while len(token_endpoint.requests) < cycle + 2 and time.monotonic() < deadline:
+                time.sleep(0.001)
+            auth.start()
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=5)
+        scheduler.close()
+
+        assert errors == []
+        assert len(token_endpoint.requests) == cycles + 1
@@ -0,0 +1,59 @@
+from datetime import timedelta
+from unittest.mock import Mock
+
+import requests
+
+from stackit.core.auth_methods.token_retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+def http_error(status_code, headers=None):
+    return requests.HTTPError(response=Mock(status_code=status_code, headers=headers if headers else {}))
+
+
+class TestRetryPolicy:
+    def test_backoff_grows_exponentially_up_to_max_backoff(self):
+        policy = RetryPolicy(max_attempts=10, backoff=timedelta(seconds=1), max_backoff=timedelta(seconds=5))
+        for attempt, limit in [(1, 1), (2, 2), (3, 4), (4, 5), (9, 5)]:
+            assert 0 <= policy.delay(attempt, requests.Timeout()) <= limit
+
+    def test_gives_up_after_max_attempts(self):
+        policy = RetryPolicy(max_attempts=2)
+        assert policy.delay(1, http_error(503)) is not None
+        assert policy.delay(2, http_error(503)) is None
+
+    def test_only_transient_errors_are_retried(self):
+        policy = RetryPolicy()
+        assert policy.is_retryable(requests.ConnectionError())
+        assert policy.is_retryable(http_error(429))
+        assert not policy.is_retryable(http_error(400))
+        assert not policy.is_retryable(CircuitOpenError())
+
+    def test_retry_after(self):
+        policy = RetryPolicy(max_backoff=timedelta(seconds=30))
+        assert policy.delay(1, http_error(503, {"Retry-After": "12"})) == 12
+        assert policy.delay(1, http_error(503, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0
+        assert policy.delay(1, http_error(503, {"Retry-After": "120"})) is None
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures_and_lets_a_single_trial_through(self, fake_clock):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=timedelta(seconds=10), clock=fake_clock)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.is_open
+        assert not breaker.allow()
+
+        fake_clock.advance(15)
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_failure()
+        assert not breaker.allow()
+
+        fake_clock.advance(15)
+        assert breaker.allow()
+        breaker.record_success()
+        assert not breaker.is_open
+        assert breaker.allow()
@@ -0,0 +1,85 @@
+import time
+from datetime import timedelta
+
+import jwt
+import pytest
+
+from stackit.core.auth_methods.token_state import RefreshPolicy, TokenState
+
+
+SIGNING_SECRET = "not-a-real-secret-only-used-for-testing"
+
+
+def make_token(**claims) -> str:
+    return jwt.encode(claims, SIGNING_SECRET, algorithm="HS256")
+
+
+class TestTokenState:
+    def test_valid_token_is_not_expired(self):
+        token = make_token(exp=int(time.time()) + 3600)
+        state = TokenState.from_token(token)
+        assert state.token == token
+        assert state.authorization_header == f"Bearer {token}"
+        assert not state.is_expired()
+
+    def test_past_token_is_expired(self):
+        state = TokenState.from_token(make_token(exp=int(time.time()) - 60))
+        assert state.is_expired()
+
+    def test_token_is_refreshed_ahead_of_expiry(self, fake_clock):
+        policy = RefreshPolicy(refresh_before=timedelta(minutes=5), jitter=timedelta(0))
+        state = TokenState.from_token(make_token(iat=fake_clock.now, exp=fake_clock.now + 3600), policy, fake_clock)
+        assert state.expires_at == fake_clock.monotonic_now + 3600
+        assert state.refresh_at == state.expires_at - 300
+
+        fake_clock.advance(3600 - 301)
+        assert not state.needs_refresh(fake_clock.monotonic())
+        fake_clock.advance(1)
+        assert state.needs_refresh(fake_clock.monotonic())
+        assert not state.is_expired(fake_clock.monotonic())
+        fake_clock.advance(300)
+        assert state.is_expired(fake_clock.monotonic())
+
+    def test_token_is_refreshed_after_lifetime_fraction(self, fake_clock):
+        policy = RefreshPolicy(lifetime_fraction=0.5, jitter=timedelta(0))
+        state = TokenState.from_token(make_token(iat=fake_clock.now, exp=fake_clock.now + 3600), policy, fake_clock)
+        assert state.refresh_at == state.issued_at + 1800
+
+    def test_short_lived_token_is_not_refreshed_right_away(self, fake_clock):
+        policy = RefreshPolicy(refresh_before=timedelta(minutes=5), jitter=timedelta(0))
+        state = TokenState.from_token(make_token(iat=fake_clock.now, exp=fake_clock.now + 60), policy, fake_clock)
+        assert state.refresh_at == state.issued_at + 30
+
+    def test_jitter_keeps_refresh_ahead_of_expiry(self, fake_clock):
+        policy = RefreshPolicy(refresh_before=timedelta(minutes=5), jitter=timedelta(minutes=10))
+        for _ in range(100):
+            state = TokenState.from_token(make_token(exp=fake_clock.now + 3600), policy, fake_clock)
+            assert state.expires_at - 300 <= state.refresh_at <= state.expires_at - 150
+
+    def test_invalid_lifetime_fraction_is_rejected(self):
+        with pytest.raises(ValueError):
+            RefreshPolicy(lifetime_fraction=1.5)
+
+    def test_missing_token_is_expired(self):
+        assert TokenState.from_token(None).is_expired()
+
+    def test_malformed_token_is_expired(self):
+        assert TokenState.from_token("not-a-jwt").is_expired()
+
+    def test_token_without_exp_never_expires(self):
+        assert not TokenState.from_token(make_token(sub="test")).is_expired()
+
+    def test_state_is_immutable(self):
+        state = TokenState.from_token(make_token(exp=int(time.time()) + 3600))
+        with pytest.raises(AttributeError):
+            state.token = "other"
+
+    def test_expiry_is_decoded_only_once(self, monkeypatch):
+        state = TokenState.from_token(make_token(exp=int(time.time()) + 3600))
+
+        def fail(*args, **kwargs):
+            raise AssertionError("token must not be decoded again")
+
+        monkeypatch.setattr(jwt, "decode", fail)
+        for _ in range(10):
+            assert not state.is_expired()